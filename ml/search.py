@@ -0,0 +1,316 @@
+"""
+Hyperparameter search with k-fold cross-validation over several model families.
+
+Candidates are sampled from SEARCH_SPACES and scored with StratifiedKFold CV.
+Every (candidate, fold) fit runs as its own job on joblib's process (loky)
+backend, and each fold result is cached on disk with joblib.Memory. Re-running
+an interrupted search therefore only fits the folds that are still missing.
+
+Strategies:
+    random    --n-iter candidates, each scored on the full training split
+    halving   successive halving: --n-iter candidates start on a small
+              subsample of the training split; after every round only the
+              best 1/--factor survive and their sample budget grows by --factor
+
+The leaderboard is written as CSV. The winner is refit on the training split,
+evaluated on the held-out test split, saved next to MODEL_PATH under a
+versioned name (crop_rf_<version>.joblib, plus a compiled export for forests)
+and, with --register-url, registered and activated through the API's
+/models/register with its metrics as metadata. Earlier winners keep their
+files, so registered records, shadow candidates and rollbacks still load the
+model they were registered with.
+
+    python ml/search.py --strategy halving --n-iter 40 --register-url http://localhost:8000
+"""
+import argparse
+import csv
+import json
+import os
+import time
+import urllib.request
+import numpy as np
+from joblib import Parallel, delayed, Memory
+from scipy.stats import randint, loguniform
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import ParameterSampler, StratifiedKFold, train_test_split
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+from train import SCRIPT_DIR, DATA_SOURCE, DATA_CSV, MODEL_PATH, FEATURE_COLUMNS, load_training_data, compile_forest, forest_dir, save_model
+
+CACHE_DIR = os.getenv('SEARCH_CACHE_DIR', os.path.join(SCRIPT_DIR, '.search_cache'))
+LEADERBOARD_PATH = os.getenv('LEADERBOARD_PATH', os.path.join(os.path.dirname(MODEL_PATH), 'leaderboard.csv'))
+
+# estimator factory and parameter distributions per family
+SEARCH_SPACES = {
+    'random_forest': (
+        lambda: RandomForestClassifier(n_jobs=1),
+        {
+            'n_estimators': randint(100, 400),
+            'max_depth': [None, 10, 20, 30],
+            'min_samples_split': randint(2, 11),
+            'min_samples_leaf': randint(1, 5),
+            'max_features': ['sqrt', 'log2', None]
+        }
+    ),
+    'extra_trees': (
+        lambda: ExtraTreesClassifier(n_jobs=1),
+        {
+            'n_estimators': randint(100, 400),
+            'max_depth': [None, 10, 20, 30],
+            'min_samples_split': randint(2, 11),
+            'min_samples_leaf': randint(1, 5),
+            'max_features': ['sqrt', 'log2', None]
+        }
+    ),
+    'hist_gradient_boosting': (
+        HistGradientBoostingClassifier,
+        {
+            'learning_rate': loguniform(0.01, 0.3),
+            'max_iter': randint(100, 400),
+            'max_leaf_nodes': randint(15, 64),
+            'l2_regularization': loguniform(1e-4, 1.0)
+        }
+    ),
+    'logistic_regression': (
+        lambda: make_pipeline(StandardScaler(), LogisticRegression(max_iter=2000)),
+        {
+            'logisticregression__C': loguniform(1e-2, 1e2)
+        }
+    )
+}
+
+
+def build_estimator(family, params, random_state):
+    factory, _ = SEARCH_SPACES[family]
+    estimator = factory()
+    estimator.set_params(**params)
+    if 'random_state' in estimator.get_params():
+        estimator.set_params(random_state=random_state)
+    return estimator
+
+
+def sample_candidates(families, n_iter, random_state):
+    """Spread n_iter sampled parameter sets evenly over the families"""
+    candidates = []
+    per_family = max(1, n_iter // len(families))
+    for i, family in enumerate(families):
+        _, space = SEARCH_SPACES[family]
+        for params in ParameterSampler(space, n_iter=per_family, random_state=random_state + i):
+            # plain Python types so candidates hash stably and serialize to JSON
+            params = {k: v.item() if isinstance(v, np.generic) else v for k, v in params.items()}
+            candidates.append({'family': family, 'params': params})
+    return candidates
+
+
+def fit_fold(family, params, X, y, train_idx, test_idx, random_state):
+    """Fit one candidate on one fold; cached on disk by joblib.Memory"""
+    estimator = build_estimator(family, params, random_state)
+    start = time.perf_counter()
+    estimator.fit(X[train_idx], y[train_idx])
+    fit_time = time.perf_counter() - start
+    pred = estimator.predict(X[test_idx])
+    return {
+        'accuracy': accuracy_score(y[test_idx], pred),
+        'f1_macro': f1_score(y[test_idx], pred, average='macro'),
+        'fit_time': fit_time
+    }
+
+
+def _subsample(y, n_samples, random_state):
+    """Stratified subset of n_samples row indices (all rows if n_samples >= len(y))"""
+    if n_samples >= len(y):
+        return np.arange(len(y))
+    idx, _ = train_test_split(np.arange(len(y)), train_size=n_samples, stratify=y, random_state=random_state)
+    return np.sort(idx)
+
+
+def evaluate(candidates, X, y, n_samples, cv, n_jobs, memory, random_state):
+    """Cross-validate every candidate on n_samples training rows, one job per fold"""
+    rows = _subsample(y, n_samples, random_state)
+    Xs, ys = X[rows], y[rows]
+    folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state).split(Xs, ys))
+    cached_fit = memory.cache(fit_fold)
+
+    jobs = [
+        delayed(cached_fit)(c['family'], c['params'], Xs, ys, train_idx, test_idx, random_state)
+        for c in candidates
+        for train_idx, test_idx in folds
+    ]
+    results = Parallel(n_jobs=n_jobs, backend='loky', verbose=5)(jobs)
+
+    scored = []
+    for i, c in enumerate(candidates):
+        fold_results = results[i * cv:(i + 1) * cv]
+        accuracy = [r['accuracy'] for r in fold_results]
+        scored.append(dict(
+            c,
+            n_samples=len(rows),
+            mean_accuracy=float(np.mean(accuracy)),
+            std_accuracy=float(np.std(accuracy)),
+            mean_f1_macro=float(np.mean([r['f1_macro'] for r in fold_results])),
+            mean_fit_time=float(np.mean([r['fit_time'] for r in fold_results]))
+        ))
+    return sorted(scored, key=lambda r: (-r['mean_accuracy'], -r['mean_f1_macro']))
+
+
+def random_search(candidates, X, y, cv, n_jobs, memory, random_state, **_):
+    return evaluate(candidates, X, y, len(y), cv, n_jobs, memory, random_state)
+
+
+def successive_halving(candidates, X, y, cv, n_jobs, memory, random_state, factor=3, min_samples=None):
+    """Keep the best 1/factor candidates per round while growing the sample budget by factor"""
+    rounds = max(1, int(np.floor(np.log(len(candidates)) / np.log(factor))) + 1)
+    n_samples = min_samples or max(cv * len(np.unique(y)) * 2, len(y) // factor ** (rounds - 1))
+    leaderboard = []
+    remaining = candidates
+    for round_no in range(rounds):
+        scored = evaluate(remaining, X, y, n_samples, cv, n_jobs, memory, random_state)
+        for entry in scored:
+            entry['round'] = round_no
+        print(f'Round {round_no}: {len(remaining)} candidates on {scored[0]["n_samples"]} samples, best accuracy {scored[0]["mean_accuracy"]:.4f}')
+        # earlier rounds rank below later ones: they were scored on less data
+        leaderboard = scored + leaderboard
+        if len(scored) <= 1 or n_samples >= len(y):
+            break
+        remaining = [{'family': e['family'], 'params': e['params']} for e in scored[:max(1, len(scored) // factor)]]
+        n_samples = min(len(y), n_samples * factor)
+    return leaderboard
+
+
+STRATEGIES = {'random': random_search, 'halving': successive_halving}
+
+
+def write_leaderboard(leaderboard, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    columns = ['rank', 'family', 'round', 'n_samples', 'mean_accuracy', 'std_accuracy', 'mean_f1_macro', 'mean_fit_time', 'params']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for rank, entry in enumerate(leaderboard, start=1):
+            writer.writerow({
+                'rank': rank,
+                'family': entry['family'],
+                'round': entry.get('round', 0),
+                'n_samples': entry['n_samples'],
+                'mean_accuracy': f"{entry['mean_accuracy']:.6f}",
+                'std_accuracy': f"{entry['std_accuracy']:.6f}",
+                'mean_f1_macro': f"{entry['mean_f1_macro']:.6f}",
+                'mean_fit_time': f"{entry['mean_fit_time']:.4f}",
+                'params': json.dumps(entry['params'], sort_keys=True)
+            })
+
+
+def versioned_path(model_path, version):
+    """Model file for one search winner, e.g. crop_rf.joblib -> crop_rf_20240101-120000.joblib"""
+    stem, ext = os.path.splitext(model_path)
+    return f'{stem}_{version}{ext}'
+
+
+def register_model(api_url, name, path, version, accuracy, metadata):
+    """Register and activate the model through the API's /models/register"""
+    body = json.dumps({
+        'name': name,
+        'path': path,
+        'version': version,
+        'accuracy': accuracy,
+        'metadata': metadata,
+        'activate': True
+    }).encode()
+    request = urllib.request.Request(
+        f"{api_url.rstrip('/')}/models/register", data=body, headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Hyperparameter search with k-fold CV over several model families')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='halving')
+    parser.add_argument('--families', default=','.join(SEARCH_SPACES), help='comma-separated subset of ' + ', '.join(SEARCH_SPACES))
+    parser.add_argument('--n-iter', type=int, default=40, help='candidates to sample (split evenly over the families)')
+    parser.add_argument('--cv', type=int, default=5)
+    parser.add_argument('--factor', type=int, default=3, help='halving: keep 1/factor candidates per round')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--leaderboard', default=LEADERBOARD_PATH)
+    parser.add_argument('--register-url', default=os.getenv('REGISTER_URL'), help='API base URL; the winner is registered and activated')
+    parser.add_argument('--api-model-dir', default=os.getenv('API_MODEL_DIR', '/app/models'), help='where the API sees ml/models')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    families = [f.strip() for f in args.families.split(',') if f.strip()]
+    unknown = [f for f in families if f not in SEARCH_SPACES]
+    if unknown:
+        raise SystemExit(f"Unknown model families: {', '.join(unknown)}")
+
+    print(f"🔎 Loading dataset from: {DATA_CSV if DATA_SOURCE == 'csv' else 'readings snapshot'}")
+    df = load_training_data()
+    X = df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    y = df['label'].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    candidates = sample_candidates(families, args.n_iter, args.random_state)
+    print(f"🔎 {args.strategy} search: {len(candidates)} candidates over {', '.join(families)}, {args.cv}-fold CV")
+    memory = Memory(args.cache_dir, verbose=0)
+    start = time.perf_counter()
+    leaderboard = STRATEGIES[args.strategy](
+        candidates, X_train, y_train, cv=args.cv, n_jobs=args.n_jobs, memory=memory,
+        random_state=args.random_state, factor=args.factor
+    )
+    search_time = time.perf_counter() - start
+    write_leaderboard(leaderboard, args.leaderboard)
+
+    print(f"\n🏆 Leaderboard (top 10 of {len(leaderboard)}, full list in {args.leaderboard}):")
+    for rank, entry in enumerate(leaderboard[:10], start=1):
+        print(f"  {rank:>2}. {entry['family']:<24} acc={entry['mean_accuracy']:.4f}±{entry['std_accuracy']:.4f} "
+              f"f1={entry['mean_f1_macro']:.4f} n={entry['n_samples']} {json.dumps(entry['params'], sort_keys=True)}")
+
+    best = leaderboard[0]
+    clf = build_estimator(best['family'], best['params'], args.random_state)
+    clf.fit(X_train, y_train)
+    y_pred = clf.predict(X_test)
+    metrics = {
+        'test_accuracy': accuracy_score(y_test, y_pred),
+        'test_precision': precision_score(y_test, y_pred, average='weighted'),
+        'test_recall': recall_score(y_test, y_pred, average='weighted'),
+        'test_f1': f1_score(y_test, y_pred, average='weighted')
+    }
+    print(f"\n✅ Winner {best['family']}: test accuracy {metrics['test_accuracy']:.4f}")
+
+    version = time.strftime('%Y%m%d-%H%M%S')
+    model_path = versioned_path(MODEL_PATH, version)
+    save_model(clf, model_path)
+    print(f"💾 Model saved to: {model_path}")
+    if isinstance(clf, (RandomForestClassifier, ExtraTreesClassifier)):
+        print(f"⚡ Compiled forest exported to: {compile_forest(clf, forest_dir(model_path), X_test)}")
+
+    if args.register_url:
+        metadata = dict(
+            metrics,
+            family=best['family'],
+            params=best['params'],
+            cv_folds=args.cv,
+            cv_mean_accuracy=best['mean_accuracy'],
+            cv_std_accuracy=best['std_accuracy'],
+            cv_mean_f1_macro=best['mean_f1_macro'],
+            strategy=args.strategy,
+            n_candidates=len(candidates),
+            search_time_seconds=round(search_time, 1),
+            training_samples=len(y_train)
+        )
+        api_path = os.path.join(args.api_model_dir, os.path.basename(model_path))
+        record = register_model(args.register_url, f"crop_{best['family']}", api_path, version, metrics['test_accuracy'], metadata)
+        print(f"📝 Registered model {record['id']} ({record['name']} {record['version']}) at {api_path}")
+    return best, metrics
+
+
+if __name__ == '__main__':
+    # run through the importable module so the fold cache is keyed on
+    # search.fit_fold whether started directly or via train.py --search
+    import search
+    search.main()
@@ -1,8 +1,16 @@
 """
 Train a RandomForest on the Kaggle Crop Recommendation dataset.
 Expected CSV columns: N,P,K,temperature,humidity,pH,rainfall,label
-Saves model to ml/models/crop_rf.joblib
+With DATA_SOURCE=db, labelled rows of the readings table are used instead
+(see readings_source.py).
+Saves model to ml/models/crop_rf.joblib and its compiled export to
+ml/models/crop_rf.forest/ (flat node arrays served by services/api/app/forest.py)
+
+    python ml/train.py                     single RandomForest (defaults below)
+    python ml/train.py --search [options]  hyperparameter search, see ml/search.py
 """
+import json
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
@@ -10,12 +18,18 @@ from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_sc
 from sklearn.preprocessing import StandardScaler
 import joblib
 import os
+import tempfile
 
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 DATA_CSV = os.getenv('DATA_CSV', os.path.join(SCRIPT_DIR, 'data', 'crop_recommendation.csv'))
 MODEL_PATH = os.getenv('MODEL_PATH', os.path.join(SCRIPT_DIR, 'models', 'crop_rf.joblib'))
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+# csv: DATA_CSV (Kaggle dataset); db: labelled readings via the incremental snapshot in readings_source.py
+DATA_SOURCE = os.getenv('DATA_SOURCE', 'csv')
+# the API's compiled forest implementation, used to verify exports before they are written
+FOREST_MODULE = os.path.join(SCRIPT_DIR, '..', 'services', 'api', 'app', 'forest.py')
 
 def load_data(path):
     """Load CSV data - handles case variations"""
@@ -35,18 +49,162 @@ def load_data(path):
     
     raise FileNotFoundError(f"Dataset not found at {path}")
 
+def load_training_data():
+    """Training DataFrame (FEATURE_COLUMNS + label) from the configured DATA_SOURCE"""
+    if DATA_SOURCE == 'db':
+        from readings_source import sync_snapshot, load_snapshot
+        sync_snapshot()
+        return load_snapshot()
+    if DATA_SOURCE != 'csv':
+        raise ValueError(f"Unknown DATA_SOURCE {DATA_SOURCE!r}, expected 'csv' or 'db'")
+    return load_data(DATA_CSV)
+
+def forest_dir(model_path):
+    """Directory for the compiled export, e.g. crop_rf.joblib -> crop_rf.forest/"""
+    return os.path.splitext(model_path)[0] + '.forest'
+
+def replace_file(path, write):
+    """
+    Write a file next to path with write(tmp_path) and rename it over path
+
+    API workers memory-map the model and its compiled arrays (MODEL_MMAP);
+    rewriting those files in place would truncate pages under them. The
+    rename leaves the old inode intact for as long as it stays mapped.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def save_model(clf, path):
+    """joblib-dump a model uncompressed (so it can be memory-mapped), replacing path atomically"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    replace_file(path, lambda tmp: joblib.dump(clf, tmp, compress=0))
+
+def _save_array(path, array):
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+    replace_file(path, write)
+
+def _preorder(tree):
+    """Node ids of a fitted sklearn tree in pre-order (left subtree first)"""
+    order, stack = [], [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if tree.children_left[node] != -1:
+            stack.append(tree.children_right[node])
+            stack.append(tree.children_left[node])
+    return np.asarray(order, dtype=np.intp)
+
+def _load_forest_module():
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('serving_forest', FOREST_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def verify_compiled(clf, arrays, max_depth, X_check):
+    """
+    Score X_check with sklearn and with the API's CompiledForest built from arrays
+
+    Raises:
+        ValueError: If the classes or the probabilities differ
+    """
+    compiled = _load_forest_module().CompiledForest(
+        classes=clf.classes_.tolist(), max_depth=max_depth, n_features=clf.n_features_in_, **arrays
+    )
+    expected = clf.predict_proba(X_check)
+    actual = compiled.predict_proba(np.asarray(X_check, dtype=np.float64))
+    if expected.shape != actual.shape or not np.allclose(actual, expected, rtol=0, atol=1e-12):
+        worst = np.abs(actual - expected).max() if expected.shape == actual.shape else 'shape mismatch'
+        raise ValueError(f'Compiled forest disagrees with predict_proba on the check sample (max abs diff {worst})')
+    if not np.array_equal(compiled.classes_[actual.argmax(axis=1)], clf.predict(X_check)):
+        raise ValueError('Compiled forest predicts different classes than the model on the check sample')
+
+def compile_forest(clf, out_dir, X_check):
+    """
+    Export a fitted RandomForestClassifier as flat NumPy node arrays
+
+    All trees are renumbered in pre-order and concatenated into one node
+    table; roots.npy holds each tree's first node and a split node's left
+    child is the node right after it. Leaves split on -inf and point right
+    to themselves so the API can walk every tree in lock step. value.npy
+    holds each node's class distribution normalized exactly like
+    DecisionTreeClassifier.predict_proba.
+
+    Before anything is written the export is scored on X_check (held-out
+    rows) with the API's CompiledForest and compared to clf.predict_proba;
+    a mismatch raises ValueError and leaves the previous export in place.
+    """
+    if clf.n_outputs_ != 1:
+        raise ValueError('Only single-output forests can be compiled')
+    os.makedirs(out_dir, exist_ok=True)
+
+    feature, threshold, right, value, roots = [], [], [], [], []
+    offset = 0
+    for estimator in clf.estimators_:
+        tree = estimator.tree_
+        order = _preorder(tree)
+        new_id = np.empty(tree.node_count, dtype=np.intp)
+        new_id[order] = np.arange(tree.node_count) + offset
+        leaf = tree.children_left[order] == -1
+        feature.append(np.where(leaf, 0, tree.feature[order]))
+        threshold.append(np.where(leaf, -np.inf, tree.threshold[order]))
+        right.append(np.where(leaf, new_id[order], new_id[tree.children_right[order]]))
+        proba = tree.value[order, 0, :clf.n_classes_].copy()
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+        value.append(proba)
+        roots.append(offset)
+        offset += tree.node_count
+
+    arrays = {
+        'feature': np.concatenate(feature).astype(np.intp),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'right': np.concatenate(right).astype(np.intp),
+        'value': np.concatenate(value).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.intp)
+    }
+    max_depth = int(max(e.tree_.max_depth for e in clf.estimators_))
+    verify_compiled(clf, arrays, max_depth, X_check)
+    for name, array in arrays.items():
+        _save_array(os.path.join(out_dir, f'{name}.npy'), array)
+    # meta.json is replaced last: the API treats its mtime as the export time
+    meta = {
+        'format_version': 1,
+        'classes': clf.classes_.tolist(),
+        'n_features': int(clf.n_features_in_),
+        'max_depth': max_depth,
+        'n_trees': len(clf.estimators_),
+        'n_nodes': int(offset)
+    }
+
+    def write_meta(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+    replace_file(os.path.join(out_dir, 'meta.json'), write_meta)
+    return out_dir
+
 def train():
     """Train RandomForest model on crop recommendation data"""
     print("🌾 Starting ML Model Training...")
-    print(f"📂 Loading dataset from: {DATA_CSV}")
+    print(f"📂 Loading dataset from: {DATA_CSV if DATA_SOURCE == 'csv' else 'readings snapshot'}")
     
     # Load data
-    df = load_data(DATA_CSV)
+    df = load_training_data()
     print(f"✅ Loaded {len(df)} samples")
     print(f"📊 Dataset columns: {df.columns.tolist()}")
     
     # Prepare features and target
-    feature_columns = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+    feature_columns = FEATURE_COLUMNS
     X = df[feature_columns]
     y = df['label']
     
@@ -102,14 +260,21 @@ def train():
     print(classification_report(y_test, y_pred_test))
     
     # Save model
-    os.makedirs(os.path.dirname(MODEL_PATH) or '.', exist_ok=True)
-    joblib.dump(clf, MODEL_PATH)
+    save_model(clf, MODEL_PATH)
     print(f"\n💾 Model saved to: {MODEL_PATH}")
     print(f"📦 Model file size: {os.path.getsize(MODEL_PATH) / 1024:.2f} KB")
+
+    compiled = compile_forest(clf, forest_dir(MODEL_PATH), X_test)
+    print(f"⚡ Compiled forest exported to: {compiled}")
     
     return clf, test_accuracy
 
 if __name__ == '__main__':
+    import sys
+    if '--search' in sys.argv[1:]:
+        from search import main as search_main
+        search_main([a for a in sys.argv[1:] if a != '--search'])
+        sys.exit(0)
     try:
         train()
         print("\n🎉 Training completed successfully!")
@@ -0,0 +1,134 @@
+"""
+Dataset-wide analytics computed in the database.
+
+``correlation`` returns the Pearson correlation of every pair of features
+with one aggregate query (``corr()`` per pair, pairwise-complete rows), and
+``farm_summary`` the per-farm reading counts and avg/min/max of every feature
+with one GROUP BY. Both cover any time window of the full readings table
+instead of a sample of recent rows, and their results are cached per window
+in ``analytics_cache`` (ANALYTICS_CACHE_TTL_SECONDS), so repeated dashboard
+renders cost a dictionary lookup.
+"""
+import itertools
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import models
+from app.cache import analytics_cache
+from app.crud import READING_FEATURES
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def _utc(ts):
+    if ts is None:
+        return None
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _window(query, start=None, end=None, farm_id=None):
+    r = models.Reading
+    if start is not None:
+        query = query.where(r.ts >= start)
+    if end is not None:
+        query = query.where(r.ts < end)
+    if farm_id is not None:
+        query = query.where(r.farm_id == farm_id)
+    return query
+
+
+def _cached(key, compute):
+    value = analytics_cache.get(key)
+    if value is None:
+        value = compute()
+        analytics_cache.put(key, value)
+    return value
+
+
+def _computed_at():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def correlation(db: Session, start: datetime = None, end: datetime = None, farm_id: int = None):
+    """
+    Correlation matrix of the reading features over a time window
+
+    Args:
+        db: Database session
+        start: Window start (inclusive), open if None
+        end: Window end (exclusive), open if None
+        farm_id: Only this farm
+
+    Returns:
+        Dict with the field order, the symmetric matrix (None where a pair has
+        no variance) and the number of readings in the window
+    """
+    def compute():
+        r = models.Reading
+        pairs = list(itertools.combinations(range(len(READING_FEATURES)), 2))
+        columns = [func.count()] + [
+            func.corr(getattr(r, READING_FEATURES[i]), getattr(r, READING_FEATURES[j])) for i, j in pairs
+        ]
+        row = db.execute(_window(select(*columns), start, end, farm_id)).one()
+        size = len(READING_FEATURES)
+        matrix = [[1.0 if i == j else None for j in range(size)] for i in range(size)]
+        for (i, j), value in zip(pairs, row[1:]):
+            matrix[i][j] = matrix[j][i] = _number(value)
+        return {
+            'fields': list(READING_FEATURES),
+            'matrix': matrix,
+            'readings': int(row[0] or 0),
+            'computed_at': _computed_at()
+        }
+
+    start, end = _utc(start), _utc(end)
+    return _cached(('correlation', start, end, farm_id), compute)
+
+
+def farm_summary(db: Session, start: datetime = None, end: datetime = None):
+    """
+    Reading counts and feature avg/min/max per farm over a time window
+
+    Args:
+        db: Database session
+        start: Window start (inclusive), open if None
+        end: Window end (exclusive), open if None
+
+    Returns:
+        Dict with one entry per farm_id, ordered by farm_id
+    """
+    def compute():
+        r = models.Reading
+        columns = [r.farm_id, func.count(), func.count(func.distinct(r.sensor_id)), func.min(r.ts), func.max(r.ts)]
+        for field in READING_FEATURES:
+            col = getattr(r, field)
+            columns += [func.avg(col), func.min(col), func.max(col)]
+        query = _window(select(*columns), start, end).group_by(r.farm_id).order_by(r.farm_id)
+        rows = db.execute(query).all()
+        names = dict(db.execute(select(models.Farm.id, models.Farm.name)).all())
+
+        farms = []
+        for row in rows:
+            farm_id, readings, sensors, first_ts, last_ts = row[:5]
+            farms.append({
+                'farm_id': farm_id,
+                'name': names.get(farm_id),
+                'readings': int(readings),
+                'sensors': int(sensors),
+                'first_ts': first_ts.isoformat() if first_ts else None,
+                'last_ts': last_ts.isoformat() if last_ts else None,
+                'fields': {
+                    field: {
+                        'avg': _number(row[5 + 3 * i]),
+                        'min': _number(row[6 + 3 * i]),
+                        'max': _number(row[7 + 3 * i])
+                    }
+                    for i, field in enumerate(READING_FEATURES)
+                }
+            })
+        return {'farms': farms, 'computed_at': _computed_at()}
+
+    start, end = _utc(start), _utc(end)
+    return _cached(('farms', start, end), compute)
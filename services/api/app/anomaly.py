@@ -0,0 +1,260 @@
+"""
+Per-sensor anomaly detection on rolling statistics, updated on every ingest.
+
+``sensor_stats`` keeps, for each sensor and each of the seven features, an
+exponentially weighted mean and variance (ANOMALY_ALPHA is the weight of a
+new value) and the number of values seen. Every ingest path calls
+``record`` in its own transaction: the batch's sensors are locked with
+SELECT ... FOR UPDATE (in sensor_id order, like app.latest), each new value
+is scored against the statistics as they were just before it, and the
+statistics are advanced. A value whose z-score reaches ANOMALY_Z_THRESHOLD
+is written to ``anomalies`` once the field has ANOMALY_MIN_COUNT values of
+history. The cost per reading is O(1): history is never rescanned.
+
+The recurrence
+
+    d = x - mean;  mean += alpha * d;  var = (1 - alpha) * (var + alpha * d**2)
+
+is evaluated for a whole batch with NumPy. Unrolled over a block of k values
+it is a cumulative sum weighted by (1 - alpha) ** -i, so each block of up to
+BLOCK_SIZE values costs a few vector operations; blocks are kept short so the
+weights stay well inside float64 range.
+"""
+import logging
+from datetime import timezone
+import numpy as np
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+from app.latest import FEATURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64
+
+
+def _utc(ts):
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def ewma_update(x: np.ndarray, count: int, mean, var, alpha: float):
+    """
+    Advance one field's EWMA statistics over new values
+
+    Args:
+        x: New values in time order (float64, finite)
+        count: Values seen so far
+        mean: Current EWMA mean (ignored when count is 0)
+        var: Current EWMA variance (ignored when count is 0)
+        alpha: Weight of a new value
+
+    Returns:
+        Tuple of (prior_mean, prior_var, prior_count, count, mean, var): the
+        statistics each value is scored against (NaN for the value that seeds
+        an empty state) and the updated state
+    """
+    n = len(x)
+    beta = 1.0 - alpha
+    prior_mean = np.empty(n)
+    prior_var = np.empty(n)
+    prior_count = count + np.arange(n)
+    start = 0
+    if count == 0 and n:
+        # the first value seeds the mean
+        prior_mean[0] = prior_var[0] = np.nan
+        mean, var = float(x[0]), 0.0
+        start = 1
+    for lo in range(start, n, BLOCK_SIZE):
+        xb = x[lo:lo + BLOCK_SIZE]
+        k = np.arange(1, len(xb) + 1)
+        decay = beta ** k
+        growth = 1.0 / decay
+        m = decay * (mean + alpha * np.cumsum(growth * xb))
+        pm = np.r_[mean, m[:-1]]
+        d = xb - pm
+        v = decay * (var + alpha * beta * np.cumsum(growth * d * d))
+        prior_mean[lo:lo + len(xb)] = pm
+        prior_var[lo:lo + len(xb)] = np.r_[var, v[:-1]]
+        mean, var = float(m[-1]), float(v[-1])
+    return prior_mean, prior_var, prior_count, count + n, mean, var
+
+
+def score(x, prior_mean, prior_var, prior_count, threshold: float, min_count: int):
+    """
+    Z-scores of values against their prior statistics
+
+    Returns:
+        Tuple of (zscores, indices of the anomalous values)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (x - prior_mean) / np.sqrt(prior_var)
+    flagged = np.flatnonzero((prior_count >= min_count) & (prior_var > 0) & (np.abs(z) >= threshold))
+    return z, flagged
+
+
+def _ensure_rows(db: Session, sensor_ids, now):
+    table = models.SensorStats.__table__
+    insert_ = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    db.execute(insert_(table).values([{'sensor_id': s, 'ts': now} for s in sensor_ids])
+               .on_conflict_do_nothing(index_elements=['sensor_id']))
+
+
+def record(db: Session, readings, now):
+    """
+    Score a batch of readings and advance the statistics of their sensors
+
+    Runs inside the caller's ingest transaction (the caller commits).
+
+    Args:
+        db: Database session
+        readings: Reading-like objects; a missing ts is taken as ``now``
+        now: Timestamp used for readings without ts
+
+    Returns:
+        Number of anomalies recorded
+    """
+    if not settings.anomaly_detection_enabled:
+        return 0
+    now = _utc(now)
+    by_sensor = {}
+    for r in readings:
+        if r.sensor_id is not None:
+            by_sensor.setdefault(r.sensor_id, []).append(r)
+    if not by_sensor:
+        return 0
+
+    sensor_ids = sorted(by_sensor)
+    table = models.SensorStats.__table__
+    _ensure_rows(db, sensor_ids, now)
+    states = db.execute(
+        select(table).where(table.c.sensor_id.in_(sensor_ids)).order_by(table.c.sensor_id).with_for_update()
+    ).mappings().all()
+
+    alpha = settings.anomaly_alpha
+    anomalies = []
+    updates = []
+    for state in states:
+        sensor_id = state['sensor_id']
+        batch = sorted(by_sensor[sensor_id], key=lambda r: _utc(r.ts) if r.ts else now)
+        ts = [_utc(r.ts) if r.ts else now for r in batch]
+        farm_ids = [r.farm_id for r in batch if r.farm_id is not None]
+        # None becomes NaN
+        values = np.array([[getattr(r, f) for f in FEATURE_COLUMNS] for r in batch], dtype=np.float64)
+
+        new_state = {c.name: state[c.name] for c in table.columns}
+        new_state['farm_id'] = farm_ids[-1] if farm_ids else state['farm_id']
+        new_state['ts'] = max(ts[-1], _utc(state['ts']))
+        for j, field in enumerate(FEATURE_COLUMNS):
+            present = np.flatnonzero(np.isfinite(values[:, j]))
+            if not len(present):
+                continue
+            x = values[present, j]
+            prior_mean, prior_var, prior_count, count, mean, var = ewma_update(
+                x, state[f'{field}_count'] or 0, state[f'{field}_mean'], state[f'{field}_var'], alpha
+            )
+            z, flagged = score(x, prior_mean, prior_var, prior_count,
+                               settings.anomaly_z_threshold, settings.anomaly_min_count)
+            for i in flagged:
+                r = batch[present[i]]
+                anomalies.append({
+                    'ts': ts[present[i]],
+                    'sensor_id': sensor_id,
+                    'farm_id': r.farm_id,
+                    'field': field,
+                    'value': float(x[i]),
+                    'mean': float(prior_mean[i]),
+                    'std': float(np.sqrt(prior_var[i])),
+                    'zscore': float(z[i])
+                })
+            new_state[f'{field}_count'] = count
+            new_state[f'{field}_mean'] = mean
+            new_state[f'{field}_var'] = var
+        updates.append({f'b_{k}': v for k, v in new_state.items()})
+
+    db.execute(
+        update(table).where(table.c.sensor_id == bindparam('b_sensor_id')).values(
+            {c.name: bindparam(f'b_{c.name}') for c in table.columns if c.name != 'sensor_id'}
+        ),
+        updates
+    )
+    if anomalies:
+        db.execute(insert(models.Anomaly), anomalies)
+        logger.info(f'Detected {len(anomalies)} anomalies in {len(readings)} readings')
+    return len(anomalies)
+
+
+def get_anomalies(db: Session, start=None, end=None, farm_id: int = None, sensor_id: str = None,
+                  field: str = None, min_zscore: float = None, limit: int = 100):
+    """
+    Recorded anomalies, newest first
+
+    Args:
+        db: Database session
+        start: Only anomalies at or after this reading time
+        end: Only anomalies before this reading time
+        farm_id: Only this farm
+        sensor_id: Only this sensor
+        field: Only this feature
+        min_zscore: Only anomalies with |z| at least this
+        limit: Maximum number of rows
+
+    Returns:
+        List of anomaly dicts
+    """
+    a = models.Anomaly
+    query = select(a)
+    if start is not None:
+        query = query.where(a.ts >= start)
+    if end is not None:
+        query = query.where(a.ts < end)
+    if farm_id is not None:
+        query = query.where(a.farm_id == farm_id)
+    if sensor_id is not None:
+        query = query.where(a.sensor_id == sensor_id)
+    if field is not None:
+        query = query.where(a.field == field)
+    if min_zscore is not None:
+        query = query.where((a.zscore >= min_zscore) | (a.zscore <= -min_zscore))
+    query = query.order_by(a.ts.desc(), a.id.desc()).limit(limit)
+    return [
+        {
+            'id': row.id,
+            'ts': row.ts.isoformat() if row.ts else None,
+            'sensor_id': row.sensor_id,
+            'farm_id': row.farm_id,
+            'field': row.field,
+            'value': row.value,
+            'mean': row.mean,
+            'std': row.std,
+            'zscore': row.zscore
+        }
+        for row in db.execute(query).scalars()
+    ]
+
+
+def get_sensor_stats(db: Session, sensor_id: str):
+    """
+    Current rolling statistics of a sensor
+
+    Returns:
+        Dict with per-field count, mean and std, or None for an unknown sensor
+    """
+    state = db.get(models.SensorStats, sensor_id)
+    if state is None:
+        return None
+    fields = {}
+    for field in FEATURE_COLUMNS:
+        var = getattr(state, f'{field}_var')
+        fields[field] = {
+            'count': getattr(state, f'{field}_count') or 0,
+            'mean': getattr(state, f'{field}_mean'),
+            'std': float(np.sqrt(var)) if var is not None else None
+        }
+    return {
+        'sensor_id': state.sensor_id,
+        'farm_id': state.farm_id,
+        'ts': state.ts.isoformat() if state.ts else None,
+        'fields': fields
+    }
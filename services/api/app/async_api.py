@@ -0,0 +1,125 @@
+"""
+Async handlers for the hottest endpoints, enabled with API_ASYNC_MODE=true.
+
+When enabled, main.py swaps these in for the sync /ingest, /predict and
+/data/filtered handlers. Database I/O goes through asyncpg; model loading
+and inference still run in the threadpool so the event loop never blocks
+on CPU-bound work.
+"""
+import asyncio
+import time
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import async_crud, crud, export, predictor
+from app.async_database import get_async_db
+from app.config import settings
+from app.ingest_buffer import submit_reading, ingest_failed, buffered_response, COMMIT_TIMEOUT_SECONDS
+from app.model_cache import model_cache
+from app.cache import prediction_cache
+from app.shadow import shadow_evaluator
+from app.schemas import ReadingIn, PredictRequest, PredictResponse, FilteredReadingsRequest, FilteredReadingsResponse
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+async def get_model(db: AsyncSession):
+    """Async equivalent of model_cache.get(db)"""
+    model = model_cache.lookup()
+    if model is not None:
+        return model
+    record = await async_crud.get_active_model(db)
+    return await run_in_threadpool(model_cache.refresh, record)
+
+
+@router.post('/ingest')
+async def ingest_async(reading: ReadingIn, db: AsyncSession = Depends(get_async_db)):
+    if settings.ingest_buffer_enabled:
+        seq, committed = submit_reading(reading)
+        if committed is not None:
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(committed), timeout=COMMIT_TIMEOUT_SECONDS)
+            except Exception as e:
+                raise ingest_failed(e)
+        return buffered_response(seq, committed)
+    r = await async_crud.create_reading(db, reading)
+    return JSONResponse({"id": r.id, "ts": str(r.ts)})
+
+
+@router.post('/predict', response_model=PredictResponse)
+async def predict_async(req: PredictRequest, db: AsyncSession = Depends(get_async_db)):
+    # resolve features
+    if req.features:
+        feats = req.features
+    elif req.farm_id:
+        r = await async_crud.get_latest_state_for_farm(db, req.farm_id)
+        if not r:
+            raise HTTPException(status_code=404, detail='No readings for farm')
+        feats = predictor.reading_features(r)
+    else:
+        raise HTTPException(status_code=400, detail='Provide features or farm_id')
+
+    try:
+        model = await get_model(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'Failed to load model: {e}')
+    if model is None:
+        # Demo mode: return placeholder predictions if model doesn't exist
+        return {'predictions': predictor.DEMO_PREDICTIONS}
+
+    try:
+        x = predictor.features_to_matrix(feats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        top_k = int(req.top_k) if getattr(req, 'top_k', None) else 5
+        start = time.perf_counter()
+        key, x = predictor.prediction_key(model_cache.token(model), x, top_k)
+        preds = prediction_cache.get(key) if key is not None else None
+        # a cache hit says nothing about the served model's latency
+        latency_ms = None
+        if preds is None:
+            preds = (await run_in_threadpool(predictor.top_k_predictions, model, x, top_k))[0]
+            if key is not None:
+                prediction_cache.put(key, preds)
+            latency_ms = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'Prediction failed: {e}')
+
+    shadow_evaluator.observe(x, [preds], latency_ms)
+
+    return {'predictions': preds}
+
+
+@router.post('/data/filtered', response_model=FilteredReadingsResponse)
+async def get_filtered_data_async(request: FilteredReadingsRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        cursor = crud.decode_cursor(request.cursor) if request.cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        readings = await async_crud.get_readings_filtered(
+            db,
+            farm_id=request.farm_id,
+            sensor_id=request.sensor_id,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            temp_min=request.temp_min,
+            temp_max=request.temp_max,
+            limit=request.limit,
+            cursor=cursor
+        )
+        
+        return {
+            'readings': [export.reading_dict(r) for r in readings],
+            'next_cursor': crud.next_page_cursor(readings, request.limit)
+        }
+    except Exception as e:
+        logger.error(f'Failed to get filtered data: {e}')
+        raise HTTPException(status_code=500, detail=f'Failed to get filtered data: {str(e)}')
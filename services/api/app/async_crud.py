@@ -0,0 +1,42 @@
+"""
+Async counterparts of the crud functions used by the async API handlers.
+
+Queries are built with the same helpers as app.crud so both modes return
+identical results.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, crud, latest, anomaly
+from app.schemas import ReadingIn
+
+
+async def create_reading(db: AsyncSession, reading: ReadingIn):
+    ts = reading.ts or datetime.now(timezone.utc)
+    row = (await db.execute(crud.reading_insert_query(reading, ts))).one()
+    for stmt in latest.upsert_statements(db.get_bind().dialect.name, [reading], ts):
+        await db.execute(stmt)
+    await db.run_sync(anomaly.record, [reading], ts)
+    await db.commit()
+    return row
+
+
+async def get_readings_filtered(db: AsyncSession, farm_id=None, sensor_id=None, start_date=None, end_date=None, temp_min=None, temp_max=None, limit=100, cursor=None):
+    query = crud.readings_filtered_query(farm_id, sensor_id, start_date, end_date, temp_min, temp_max, limit, cursor)
+    return (await db.execute(query)).scalars().all()
+
+
+async def get_latest_reading_for_farm(db: AsyncSession, farm_id: int):
+    return (await db.execute(crud.latest_reading_for_farm_query(farm_id))).scalars().first()
+
+
+async def get_latest_state_for_farm(db: AsyncSession, farm_id: int):
+    state = await db.get(models.FarmLatest, farm_id)
+    if state is not None:
+        return state
+    return await get_latest_reading_for_farm(db, farm_id)
+
+
+async def get_active_model(db: AsyncSession):
+    query = select(models.ModelRecord).where(models.ModelRecord.active == True).order_by(models.ModelRecord.created_at.desc()).limit(1)
+    return (await db.execute(query)).scalars().first()
@@ -0,0 +1,31 @@
+"""
+Opt-in async database stack (API_ASYNC_MODE=true).
+
+Lives alongside the sync engine in app.database: same database, but an
+asyncpg driver and AsyncSession so handlers do not hold a threadpool thread
+for the database round-trip.
+"""
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.config import settings
+from app.database import engine_options
+
+
+def async_database_url(url: str) -> str:
+    """Rewrite a postgresql[+driver]:// URL to use the asyncpg driver"""
+    scheme, sep, rest = url.partition('://')
+    if scheme.startswith('postgresql'):
+        return f'postgresql+asyncpg{sep}{rest}'
+    return url
+
+
+async_engine = create_async_engine(
+    settings.async_database_url or async_database_url(settings.database_url),
+    **engine_options(async_engine=True)
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+# dependency
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
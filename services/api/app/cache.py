@@ -0,0 +1,138 @@
+"""
+Small in-process caches shared by the API endpoints.
+"""
+import threading
+import time
+from collections import OrderedDict
+from app.config import settings
+
+
+class TTLSnapshot:
+    """
+    A single cached value refreshed at most once per TTL (single-flight).
+
+    When the snapshot expires, one caller recomputes it while concurrent
+    callers keep getting the previous value; they only wait if there is no
+    value yet.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._value = None
+        self._has_value = False
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+
+    def get(self, compute):
+        """
+        Return the cached value, calling compute() if it has expired
+
+        Args:
+            compute: Zero-argument callable producing a fresh value; if it
+                raises, the exception propagates and nothing is cached
+        """
+        if self._has_value and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._value
+
+        if not self._lock.acquire(blocking=not self._has_value):
+            # a refresh is already in flight; serve the previous snapshot
+            self.hits += 1
+            return self._value
+        try:
+            if self._has_value and time.monotonic() < self._expires_at:
+                self.hits += 1
+                return self._value
+            value = compute()
+            self._value = value
+            self._has_value = True
+            self._expires_at = time.monotonic() + self.ttl
+            self.refreshes += 1
+            return value
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """Force the next get() to recompute"""
+        self._expires_at = 0.0
+
+
+class LRUCache:
+    """
+    Size-bounded LRU cache whose entries also expire after a TTL.
+
+    A max_entries of 0 disables the cache: get() always misses and put() is
+    a no-op.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+# /predict results keyed on (model, quantized features, top_k); see app.predictor
+prediction_cache = LRUCache(settings.prediction_cache_size, settings.prediction_cache_ttl_seconds)
+
+# /analytics results keyed on (endpoint, window, filters); see app.analytics
+analytics_cache = LRUCache(settings.analytics_cache_size, settings.analytics_cache_ttl_seconds)
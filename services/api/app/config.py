@@ -2,6 +2,59 @@ import os
 
 class Settings:
     database_url: str = os.getenv('DATABASE_URL', 'postgresql+psycopg2://postgres:postgres@db:5432/smart_agri')
+    # connection pool (per worker process)
+    db_pool_size: int = int(os.getenv('DB_POOL_SIZE', '5'))
+    db_max_overflow: int = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    db_pool_timeout: float = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+    db_pool_recycle: int = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    db_pool_pre_ping: bool = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    # behind PgBouncer (transaction pooling): no client-side pool, no prepared statement cache
+    db_pgbouncer_mode: bool = os.getenv('DB_PGBOUNCER_MODE', 'false').lower() in ('1', 'true', 'yes')
+    # schema migrations (app.migrate); the advisory lock needs a direct, non-PgBouncer connection
+    migrate_database_url: str = os.getenv('MIGRATE_DATABASE_URL', '')
+    migrate_connect_timeout: float = float(os.getenv('MIGRATE_CONNECT_TIMEOUT', '60'))
+    # apply pending migrations from the API start-up instead of a separate migrate run (local development)
+    migrate_on_startup: bool = os.getenv('MIGRATE_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+    # readings hypertable storage, applied by app.migrate (see app.storage); empty disables a policy
+    readings_chunk_interval: str = os.getenv('READINGS_CHUNK_INTERVAL', '7 days')
+    readings_compress_after: str = os.getenv('READINGS_COMPRESS_AFTER', '7 days')
+    readings_retention: str = os.getenv('READINGS_RETENTION', '')
+    # /data/series reads raw readings for ranges up to this many hours and rows, rollups beyond
+    series_raw_max_hours: float = float(os.getenv('SERIES_RAW_MAX_HOURS', '48'))
+    series_raw_max_rows: int = int(os.getenv('SERIES_RAW_MAX_ROWS', '200000'))
+    # per-sensor EWMA anomaly detection on ingest (see app.anomaly)
+    anomaly_detection_enabled: bool = os.getenv('ANOMALY_DETECTION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    anomaly_alpha: float = float(os.getenv('ANOMALY_ALPHA', '0.05'))
+    anomaly_z_threshold: float = float(os.getenv('ANOMALY_Z_THRESHOLD', '4'))
+    anomaly_min_count: int = int(os.getenv('ANOMALY_MIN_COUNT', '30'))
+    # /analytics/correlation and /analytics/farms results cached per time window
+    analytics_cache_size: int = int(os.getenv('ANALYTICS_CACHE_SIZE', '256'))
+    analytics_cache_ttl_seconds: float = float(os.getenv('ANALYTICS_CACHE_TTL_SECONDS', '60'))
+    # opt-in async stack (asyncpg) for /ingest, /predict and /data/filtered
+    api_async_mode: bool = os.getenv('API_ASYNC_MODE', 'false').lower() in ('1', 'true', 'yes')
+    # defaults to DATABASE_URL rewritten for the asyncpg driver
+    async_database_url: str = os.getenv('ASYNC_DATABASE_URL', '')
+    # write-behind buffer for single /ingest calls (see app.ingest_buffer)
+    ingest_buffer_enabled: bool = os.getenv('INGEST_BUFFER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    ingest_buffer_max_rows: int = int(os.getenv('INGEST_BUFFER_MAX_ROWS', '1000'))
+    ingest_buffer_flush_ms: float = float(os.getenv('INGEST_BUFFER_FLUSH_MS', '200'))
+    ingest_buffer_max_pending: int = int(os.getenv('INGEST_BUFFER_MAX_PENDING', '50000'))
+    ingest_buffer_durability: str = os.getenv('INGEST_BUFFER_DURABILITY', 'commit')
     model_path: str = os.getenv('MODEL_PATH', '/app/models/crop_rf.joblib')
+    # serve <stem>.forest/ (compiled by ml/train.py) instead of the joblib file when it is up to date
+    model_prefer_compiled: bool = os.getenv('MODEL_PREFER_COMPILED', 'true').lower() in ('1', 'true', 'yes')
+    # memory-map model arrays read-only so workers share the page cache instead of private copies
+    model_mmap: bool = os.getenv('MODEL_MMAP', 'true').lower() in ('1', 'true', 'yes')
+    # shadow evaluation of candidate models (see app.shadow)
+    shadow_workers: int = int(os.getenv('SHADOW_WORKERS', '2'))
+    shadow_max_pending: int = int(os.getenv('SHADOW_MAX_PENDING', '100'))
+    # how often (seconds) the model cache re-checks the active model record and file mtime
+    model_cache_check_seconds: float = float(os.getenv('MODEL_CACHE_CHECK_SECONDS', '5'))
+    # lifetime (seconds) of the cached /data/stats snapshot
+    stats_cache_ttl_seconds: float = float(os.getenv('STATS_CACHE_TTL_SECONDS', '5'))
+    # /predict result cache (0 entries disables it); features are rounded to PREDICTION_CACHE_DECIMALS
+    prediction_cache_size: int = int(os.getenv('PREDICTION_CACHE_SIZE', '10000'))
+    prediction_cache_ttl_seconds: float = float(os.getenv('PREDICTION_CACHE_TTL_SECONDS', '300'))
+    prediction_cache_decimals: int = int(os.getenv('PREDICTION_CACHE_DECIMALS', '2'))
 
 settings = Settings()
@@ -1,160 +1,200 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app import models
+from sqlalchemy import func, insert, select, text, tuple_
+from app import models, ingest, latest, anomaly
+from app.cache import prediction_cache
 from app.schemas import ReadingIn
-from datetime import datetime
+from datetime import datetime, timezone
+import base64
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# numeric sensor fields of a reading
+READING_FEATURES = ['temperature', 'humidity', 'ph', 'rainfall', 'n', 'p', 'k']
+# all columns of a reading, in API/export order
+READING_COLUMNS = ['id', 'sensor_id', 'farm_id', 'ts'] + READING_FEATURES + ['label']
+
+def reading_insert_query(reading: ReadingIn, ts: datetime):
+    """INSERT of one reading returning its id and ts"""
+    values = {c: getattr(reading, c) for c in ['sensor_id', 'farm_id'] + READING_FEATURES + ['label']}
+    return insert(models.Reading).values(ts=ts, **values).returning(models.Reading.id, models.Reading.ts)
+
 def create_reading(db: Session, reading: ReadingIn):
-    r = models.Reading(
-        sensor_id=reading.sensor_id,
-        farm_id=reading.farm_id,
-        temperature=reading.temperature,
-        humidity=reading.humidity,
-        ph=reading.ph,
-        rainfall=reading.rainfall,
-        n=reading.n,
-        p=reading.p,
-        k=reading.k
-    )
-    db.add(r)
+    """
+    Insert one reading and update farm_latest/sensor_latest and the anomaly statistics
+
+    ts is filled in client-side when missing (like the COPY path in app.ingest),
+    so the row never has to be read back.
+
+    Returns:
+        Row with the new reading's id and ts
+    """
+    ts = reading.ts or datetime.now(timezone.utc)
+    row = db.execute(reading_insert_query(reading, ts)).one()
+    latest.record(db, [reading], ts)
+    anomaly.record(db, [reading], ts)
     db.commit()
-    db.refresh(r)
-    return r
+    return row
 
-def create_readings_bulk(db: Session, readings: list):
+def create_readings_bulk(db: Session, readings: list, batch_size: int = 500):
     """
     Bulk insert readings with batch processing
     
+    Each batch is streamed into the readings table with COPY FROM STDIN
+    and committed on its own (see app.ingest).
+    
     Args:
         db: Database session
         readings: List of ReadingIn objects
+        batch_size: Rows per COPY/commit
     
     Returns:
         Tuple of (successful_count, failed_count, errors)
     """
-    successful = 0
-    failed = 0
-    errors = []
-    batch_size = 500
-    
-    try:
-        for i in range(0, len(readings), batch_size):
-            batch = readings[i:i+batch_size]
-            try:
-                for reading in batch:
-                    r = models.Reading(
-                        sensor_id=reading.sensor_id,
-                        farm_id=reading.farm_id,
-                        temperature=reading.temperature,
-                        humidity=reading.humidity,
-                        ph=reading.ph,
-                        rainfall=reading.rainfall,
-                        n=reading.n,
-                        p=reading.p,
-                        k=reading.k
-                    )
-                    db.add(r)
-                
-                db.commit()
-                successful += len(batch)
-            except Exception as e:
-                db.rollback()
-                failed += len(batch)
-                errors.append({
-                    'batch': i // batch_size,
-                    'error': str(e),
-                    'rows_affected': len(batch)
-                })
-                logger.error(f"Batch {i//batch_size} failed: {e}")
-    except Exception as e:
-        logger.error(f"Bulk insert failed: {e}")
-        errors.append({'error': str(e)})
-    
-    return successful, failed, errors
+    return ingest.copy_readings(db, readings, batch_size=batch_size)
+
+def _field_stats(mn, mx, avg):
+    return {
+        'min': float(mn) if mn is not None else None,
+        'max': float(mx) if mx is not None else None,
+        'avg': float(avg) if avg is not None else None
+    }
 
 def get_data_statistics(db: Session):
     """
     Get aggregate statistics about readings
+    
+    All counts, the date range and min/max/avg of every sensor field are
+    computed in a single aggregate query (one scan of readings).
+    
+    Raises:
+        SQLAlchemyError: If the query fails (callers must not cache a result)
+    """
+    columns = [
+        func.count(models.Reading.id),
+        func.count(func.distinct(models.Reading.farm_id)),
+        func.count(func.distinct(models.Reading.sensor_id)),
+        func.min(models.Reading.ts),
+        func.max(models.Reading.ts)
+    ]
+    for field in READING_FEATURES:
+        col = getattr(models.Reading, field)
+        columns += [func.min(col), func.max(col), func.avg(col)]
+    row = db.execute(select(*columns)).one()
+    
+    total, unique_farms, unique_sensors, min_date, max_date = row[:5]
+    field_stats = {
+        field: _field_stats(*row[5 + 3 * i:8 + 3 * i])
+        for i, field in enumerate(READING_FEATURES)
+    }
+    
+    return {
+        'total_readings': int(total or 0),
+        'unique_farms': int(unique_farms or 0),
+        'unique_sensors': int(unique_sensors or 0),
+        'date_range': {
+            'min': str(min_date) if min_date else None,
+            'max': str(max_date) if max_date else None
+        },
+        'temp_stats': field_stats['temperature'],
+        'humidity_stats': field_stats['humidity'],
+        'field_stats': field_stats
+    }
+
+def encode_cursor(ts, reading_id) -> str:
+    """Opaque keyset cursor for the (ts, id) position of a reading"""
+    return base64.urlsafe_b64encode(f'{ts.isoformat()}|{reading_id}'.encode()).decode()
+
+def decode_cursor(cursor: str):
+    """
+    Decode a cursor from encode_cursor into (ts, id)
+    
+    Raises:
+        ValueError: If the cursor is malformed
     """
     try:
-        total = db.query(func.count(models.Reading.id)).scalar() or 0
-        unique_farms = db.query(func.count(func.distinct(models.Reading.farm_id))).scalar() or 0
-        unique_sensors = db.query(func.count(func.distinct(models.Reading.sensor_id))).scalar() or 0
-        
-        # Date range
-        min_date = db.query(func.min(models.Reading.ts)).scalar()
-        max_date = db.query(func.max(models.Reading.ts)).scalar()
-        
-        # Temperature stats
-        temp_min = db.query(func.min(models.Reading.temperature)).scalar()
-        temp_max = db.query(func.max(models.Reading.temperature)).scalar()
-        temp_avg = db.query(func.avg(models.Reading.temperature)).scalar()
-        
-        # Humidity stats
-        humidity_min = db.query(func.min(models.Reading.humidity)).scalar()
-        humidity_max = db.query(func.max(models.Reading.humidity)).scalar()
-        humidity_avg = db.query(func.avg(models.Reading.humidity)).scalar()
-        
-        return {
-            'total_readings': int(total),
-            'unique_farms': int(unique_farms),
-            'unique_sensors': int(unique_sensors),
-            'date_range': {
-                'min': str(min_date) if min_date else None,
-                'max': str(max_date) if max_date else None
-            },
-            'temp_stats': {
-                'min': float(temp_min) if temp_min else None,
-                'max': float(temp_max) if temp_max else None,
-                'avg': float(temp_avg) if temp_avg else None
-            },
-            'humidity_stats': {
-                'min': float(humidity_min) if humidity_min else None,
-                'max': float(humidity_max) if humidity_max else None,
-                'avg': float(humidity_avg) if humidity_avg else None
-            }
-        }
-    except Exception as e:
-        logger.error(f"Error getting statistics: {e}")
-        return {
-            'total_readings': 0,
-            'unique_farms': 0,
-            'unique_sensors': 0,
-            'date_range': {'min': None, 'max': None},
-            'temp_stats': {'min': None, 'max': None, 'avg': None},
-            'humidity_stats': {'min': None, 'max': None, 'avg': None}
-        }
+        ts, reading_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(ts), int(reading_id)
+    except Exception:
+        raise ValueError(f'Invalid cursor: {cursor}')
 
-def get_readings_filtered(db: Session, farm_id=None, sensor_id=None, start_date=None, end_date=None, temp_min=None, temp_max=None, limit=100):
+def readings_filtered_query(farm_id=None, sensor_id=None, start_date=None, end_date=None, temp_min=None, temp_max=None, limit=100, cursor=None):
     """
-    Get filtered readings
+    Build the SELECT used by get_readings_filtered (shared with app.async_crud)
+    
+    Rows are ordered newest first on (ts, id); cursor is a decoded (ts, id)
+    keyset position and only rows strictly after it are returned.
     """
-    query = db.query(models.Reading)
+    query = select(models.Reading)
     
     if farm_id:
-        query = query.filter(models.Reading.farm_id == farm_id)
+        query = query.where(models.Reading.farm_id == farm_id)
     if sensor_id:
-        query = query.filter(models.Reading.sensor_id == sensor_id)
+        query = query.where(models.Reading.sensor_id == sensor_id)
     if start_date:
-        query = query.filter(models.Reading.ts >= start_date)
+        query = query.where(models.Reading.ts >= start_date)
     if end_date:
-        query = query.filter(models.Reading.ts <= end_date)
+        query = query.where(models.Reading.ts <= end_date)
     if temp_min is not None:
-        query = query.filter(models.Reading.temperature >= temp_min)
+        query = query.where(models.Reading.temperature >= temp_min)
     if temp_max is not None:
-        query = query.filter(models.Reading.temperature <= temp_max)
+        query = query.where(models.Reading.temperature <= temp_max)
+    if cursor is not None:
+        query = query.where(tuple_(models.Reading.ts, models.Reading.id) < tuple_(*cursor))
+    
+    query = query.order_by(models.Reading.ts.desc(), models.Reading.id.desc())
+    return query.limit(limit) if limit else query
+
+def get_readings_filtered(db: Session, farm_id=None, sensor_id=None, start_date=None, end_date=None, temp_min=None, temp_max=None, limit=100, cursor=None):
+    """
+    Get filtered readings (one keyset page when cursor is given)
+    """
+    query = readings_filtered_query(farm_id, sensor_id, start_date, end_date, temp_min, temp_max, limit, cursor)
+    return db.execute(query).scalars().all()
+
+def next_page_cursor(readings, limit):
+    """Cursor for the page after readings, or None if this was the last page"""
+    if not limit or len(readings) < limit:
+        return None
+    last = readings[-1]
+    return encode_cursor(last.ts, last.id)
+
+def iter_readings_filtered(db: Session, columns=None, chunk_size: int = 5000, **filters):
+    """
+    Stream filtered readings from a server-side cursor
+    
+    Args:
+        db: Database session (kept busy until the generator is exhausted)
+        columns: Reading column names to select (default: all of READING_COLUMNS)
+        chunk_size: Rows fetched from the cursor per chunk
+        **filters: Same filters as get_readings_filtered; limit=None streams all rows
     
-    return query.order_by(models.Reading.ts.desc()).limit(limit).all()
+    Yields:
+        Lists of row tuples in the order of columns
+    """
+    columns = columns or READING_COLUMNS
+    query = readings_filtered_query(**filters).with_only_columns(*[getattr(models.Reading, c) for c in columns])
+    result = db.execute(query.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield partition
 
 def truncate_readings(db: Session):
     """
     Delete all readings
+    
+    Uses TRUNCATE on Postgres: it is instant on the hypertable and, unlike
+    DELETE, works on compressed chunks.
     """
     try:
-        db.query(models.Reading).delete()
+        if db.get_bind().dialect.name == 'postgresql':
+            db.execute(text('TRUNCATE readings'))
+        else:
+            db.query(models.Reading).delete()
+        db.query(models.FarmLatest).delete()
+        db.query(models.SensorLatest).delete()
+        db.query(models.SensorStats).delete()
+        db.query(models.Anomaly).delete()
         db.commit()
         return True
     except Exception as e:
@@ -162,8 +202,23 @@ def truncate_readings(db: Session):
         logger.error(f"Error truncating readings: {e}")
         return False
 
+def latest_reading_for_farm_query(farm_id: int):
+    return select(models.Reading).where(models.Reading.farm_id == farm_id).order_by(models.Reading.ts.desc()).limit(1)
+
 def get_latest_reading_for_farm(db: Session, farm_id: int):
-    return db.query(models.Reading).filter(models.Reading.farm_id==farm_id).order_by(models.Reading.ts.desc()).first()
+    return db.execute(latest_reading_for_farm_query(farm_id)).scalars().first()
+
+def get_latest_state_for_farm(db: Session, farm_id: int):
+    """
+    Most recent feature values of a farm
+
+    Reads the farm_latest row maintained on ingest and only falls back to
+    scanning readings for farms that have no row there yet.
+    """
+    state = db.get(models.FarmLatest, farm_id)
+    if state is not None:
+        return state
+    return get_latest_reading_for_farm(db, farm_id)
 
 # Model CRUD
 
@@ -175,13 +230,58 @@ def register_model(db: Session, name: str, path: str, version: str=None, accurac
     db.add(m)
     db.commit()
     db.refresh(m)
+    if activate:
+        # cached predictions belong to the previously active model
+        prediction_cache.invalidate()
     return m
 
 
+def parse_model_metadata(value):
+    """
+    Decode a stored model_metadata value into a dict
+
+    The column is JSONB, which psycopg2 already returns as a dict; text
+    values are parsed. Legacy rows that are not valid JSON come back as
+    {'raw': value} instead of failing the response.
+    """
+    if not value:
+        return None
+    if isinstance(value, dict):
+        return value
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        return {'raw': value}
+    return parsed if isinstance(parsed, dict) else {'value': parsed}
+
+
 def get_active_model(db: Session):
     return db.query(models.ModelRecord).filter(models.ModelRecord.active==True).order_by(models.ModelRecord.created_at.desc()).first()
 
 
+def get_shadow_models(db: Session):
+    """Inactive models that score a fraction of live traffic in shadow mode"""
+    return db.query(models.ModelRecord).filter(
+        models.ModelRecord.active != True, models.ModelRecord.shadow_fraction > 0
+    ).order_by(models.ModelRecord.id).all()
+
+
+def set_shadow_fraction(db: Session, model_id: int, fraction: float):
+    """
+    Set the share of traffic a model scores in shadow mode
+
+    Returns:
+        The updated model record, or None if it does not exist
+    """
+    m = db.get(models.ModelRecord, model_id)
+    if m is None:
+        return None
+    m.shadow_fraction = fraction
+    db.commit()
+    db.refresh(m)
+    return m
+
+
 def list_models(db: Session, limit: int=10):
     return db.query(models.ModelRecord).order_by(models.ModelRecord.created_at.desc()).limit(limit).all()
 
@@ -1,7 +1,112 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from collections import deque
+from sqlalchemy import create_engine, exc
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
 from app.config import settings
 
-engine = create_engine(settings.database_url, future=True)
+
+class PoolWaitStats:
+    """How long checkouts waited for a connection (including connect time)"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent.append(wait)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            waits = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': self.total_wait / waits * 1000 if waits else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+                'p95_wait_ms': recent[int(0.95 * (len(recent) - 1))] * 1000 if recent else 0.0
+            }
+
+
+class _TimedCheckout:
+    """Pool mixin recording checkout wait times in self.wait_stats"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return conn
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(async_engine: bool = False) -> dict:
+    """
+    Pool keyword arguments for create_engine / create_async_engine
+
+    In PgBouncer mode the API keeps no pool of its own (NullPool) and lets
+    PgBouncer multiplex server connections; asyncpg's prepared statement
+    cache is disabled since it breaks under transaction pooling.
+    """
+    if settings.db_pgbouncer_mode:
+        options = {'poolclass': NullPool, 'pool_pre_ping': settings.db_pool_pre_ping}
+        if async_engine:
+            options['connect_args'] = {'statement_cache_size': 0}
+        return options
+    return {
+        'poolclass': TimedAsyncQueuePool if async_engine else TimedQueuePool,
+        'pool_size': settings.db_pool_size,
+        'max_overflow': settings.db_max_overflow,
+        'pool_timeout': settings.db_pool_timeout,
+        'pool_recycle': settings.db_pool_recycle,
+        'pool_pre_ping': settings.db_pool_pre_ping
+    }
+
+
+def pool_status(pool) -> dict:
+    """Connection counts and wait times for an engine's pool"""
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'pool_size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            # QueuePool.overflow() is negative until pool_size connections exist
+            'overflow': max(pool.overflow(), 0)
+        })
+    if hasattr(pool, 'wait_stats'):
+        status['wait'] = pool.wait_stats.snapshot()
+    return status
+
+
+engine = create_engine(settings.database_url, future=True, **engine_options())
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
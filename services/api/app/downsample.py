@@ -0,0 +1,252 @@
+"""
+Shape-preserving downsampling of one reading field for charts (GET /data/series).
+
+Two methods bound the number of points returned whatever the time range:
+
+    lttb    Largest-Triangle-Three-Buckets: splits the series into n_out - 2
+            equal-count buckets and keeps, per bucket, the point forming the
+            largest triangle with the previously kept point and the average
+            of the next bucket. Bucket averages are computed for all buckets
+            at once with np.add.reduceat; the choice within a bucket depends
+            on the previous choice, so only that step loops (once per output
+            point, vectorized over the bucket).
+    minmax  splits the time axis into n_out / 2 equal-width (pixel) buckets
+            and keeps the minimum and maximum of each, fully vectorized with
+            ufunc.reduceat. Spikes always survive.
+
+Short ranges are downsampled from the raw readings. Ranges longer than
+SERIES_RAW_MAX_HOURS (or with more than SERIES_RAW_MAX_ROWS readings) are
+read from the continuous aggregates instead (app.rollup) at a few times the
+point budget, so wide charts never pull raw rows. An explicit source=raw
+request over more than SERIES_RAW_MAX_ROWS readings is refused.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.orm import Session
+from app import models, rollup
+from app.config import settings
+from app.crud import READING_FEATURES
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('lttb', 'minmax')
+SOURCES = ('auto', 'raw', 'rollup')
+DEFAULT_MAX_POINTS = 2000
+MAX_POINTS = 10000
+# rollup buckets fetched per output point before downsampling
+ROLLUP_OVERSAMPLE = 4
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets
+
+    Args:
+        x: Sorted x values (float64)
+        y: y values (float64, finite)
+        n_out: Number of points to keep (the first and last are always kept)
+
+    Returns:
+        Increasing int64 indices into x/y
+    """
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])
+
+    # n_out - 2 equal-count buckets over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # third triangle vertex of each bucket: the next bucket's average (the last point for the final bucket)
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ax, ay = x[a], y[a]
+        # twice the triangle area, up to sign
+        area = np.abs((ax - next_x[b]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[b] - ay))
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of each equal-width x bucket
+
+    Args:
+        x: Sorted x values (float64)
+        y: y values (float64, finite)
+        n_out: Approximate number of points to keep (two per bucket, plus the endpoints)
+
+    Returns:
+        Increasing int64 indices into x/y
+    """
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    n_buckets = max(1, (n_out - 2) // 2)
+    span = x[-1] - x[0]
+    if span <= 0:
+        bucket = np.zeros(n, dtype=np.int64)
+    else:
+        bucket = np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+    # x is sorted, so each non-empty bucket is one contiguous slice
+    starts = np.r_[0, np.flatnonzero(np.diff(bucket)) + 1]
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    idx = np.arange(n)
+    # first index in each slice holding the slice's minimum / maximum
+    lows = np.minimum.reduceat(np.where(y == np.minimum.reduceat(y, starts)[segment], idx, n), starts)
+    highs = np.minimum.reduceat(np.where(y == np.maximum.reduceat(y, starts)[segment], idx, n), starts)
+    return np.unique(np.concatenate([lows, highs, [0, n - 1]]))
+
+
+def downsample(x: np.ndarray, y: np.ndarray, n_out: int, method: str = 'lttb'):
+    """
+    Reduce a series to about n_out points
+
+    Non-finite y values are dropped first.
+
+    Returns:
+        Tuple of (x, y) arrays of the kept points
+    """
+    keep = np.isfinite(y)
+    x, y = x[keep], y[keep]
+    idx = lttb(x, y, n_out) if method == 'lttb' else minmax(x, y, n_out)
+    return x[idx], y[idx]
+
+
+def _utc(ts: datetime):
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def load_raw(db: Session, field: str, start: datetime, end: datetime, farm_id: int = None,
+             sensor_id: str = None, limit: int = None):
+    """
+    Raw (epoch seconds, value) arrays of one field in time order
+
+    Returns:
+        Tuple of (x, y) float64 arrays, at most limit rows
+    """
+    col = getattr(models.Reading, field)
+    query = select(cast(func.extract('epoch', models.Reading.ts), Float), cast(col, Float)).where(
+        models.Reading.ts >= start, models.Reading.ts < end, col.isnot(None)
+    )
+    if farm_id is not None:
+        query = query.where(models.Reading.farm_id == farm_id)
+    if sensor_id is not None:
+        query = query.where(models.Reading.sensor_id == sensor_id)
+    query = query.order_by(models.Reading.ts)
+    if limit:
+        query = query.limit(limit)
+    rows = db.execute(query).all()
+    data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+def load_rollup(db: Session, field: str, start: datetime, end: datetime, farm_id: int = None,
+                sensor_id: str = None, max_points: int = DEFAULT_MAX_POINTS, method: str = 'lttb'):
+    """
+    (epoch seconds, value) arrays from the continuous aggregates
+
+    For lttb the bucket averages are returned; for minmax each bucket
+    contributes its minimum and maximum so extremes are preserved.
+
+    Returns:
+        Tuple of (x, y, bucket_seconds)
+    """
+    budget = min(max_points * ROLLUP_OVERSAMPLE, rollup.MAX_POINTS)
+    result = rollup.get_rollup(db, start=start, end=end, farm_id=farm_id, sensor_id=sensor_id,
+                               max_points=budget, features=[field])
+    x, y = [], []
+    for point in result['points']:
+        stats = point[field]
+        if stats['count'] == 0:
+            continue
+        ts = datetime.fromisoformat(point['ts']).timestamp()
+        if method == 'minmax':
+            x += [ts, ts]
+            y += [stats['min'], stats['max']]
+        else:
+            x.append(ts)
+            y.append(stats['avg'])
+    return np.array(x, dtype=np.float64), np.array(y, dtype=np.float64), result['bucket_seconds']
+
+
+def _iso(x: np.ndarray):
+    return np.datetime_as_string(np.round(x * 1e6).astype(np.int64).astype('datetime64[us]'), timezone='UTC').tolist()
+
+
+def get_series(db: Session, field: str, start: datetime = None, end: datetime = None, farm_id: int = None,
+               sensor_id: str = None, max_points: int = DEFAULT_MAX_POINTS, method: str = 'lttb',
+               source: str = 'auto'):
+    """
+    Downsampled time series of one field
+
+    Args:
+        db: Database session
+        field: Reading feature to chart
+        start: Range start (default: end - 1 day); naive datetimes are UTC
+        end: Range end, exclusive (default: now)
+        farm_id: Only this farm
+        sensor_id: Only this sensor
+        max_points: Point budget of the response
+        method: 'lttb' or 'minmax'
+        source: 'raw', 'rollup', or 'auto' (raw for short ranges with few rows)
+
+    Returns:
+        Dict with the source used, number of input points and parallel ts / values lists
+
+    Raises:
+        ValueError: On an unknown field, method or source, an empty range, or
+            source='raw' over more than SERIES_RAW_MAX_ROWS readings
+    """
+    if field not in READING_FEATURES:
+        raise ValueError(f"Unknown field '{field}', expected one of {READING_FEATURES}")
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {list(METHODS)}")
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source '{source}', expected one of {list(SOURCES)}")
+    end = _utc(end) if end else datetime.now(timezone.utc)
+    start = _utc(start) if start else end - rollup.DEFAULT_RANGE
+    if start >= end:
+        raise ValueError('start must be before end')
+
+    bucket_seconds = None
+    use_raw = source == 'raw' or (
+        source == 'auto' and end - start <= timedelta(hours=settings.series_raw_max_hours)
+    )
+    if use_raw:
+        # one row past the cap means "too many": auto falls back to the rollups, raw is refused
+        limit = settings.series_raw_max_rows + 1
+        x, y = load_raw(db, field, start, end, farm_id, sensor_id, limit=limit)
+        if len(x) >= limit:
+            if source == 'raw':
+                raise ValueError(f'More than {settings.series_raw_max_rows} raw readings in this range; '
+                                 f'narrow the range or use source=rollup')
+            logger.info(f'/data/series: more than {settings.series_raw_max_rows} raw rows, reading rollups instead')
+            use_raw = False
+    if not use_raw:
+        x, y, bucket_seconds = load_rollup(db, field, start, end, farm_id, sensor_id, max_points, method)
+
+    input_points = len(x)
+    x, y = downsample(x, y, max_points, method)
+    return {
+        'field': field,
+        'method': method,
+        'source': 'raw' if use_raw else 'rollup',
+        'bucket_seconds': bucket_seconds,
+        'input_points': input_points,
+        'ts': _iso(x),
+        'values': y.tolist()
+    }
@@ -0,0 +1,158 @@
+"""
+Serializers for streamed reading exports.
+
+Each writer consumes chunks of row tuples (see crud.iter_readings_filtered)
+and yields encoded chunks as they arrive, so an export never holds more
+than one chunk in memory. Arrow IPC and Parquet output need the optional
+pyarrow package and emit one record batch / row group per chunk.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+# formats that need the optional pyarrow dependency
+ARROW_FORMATS = {'arrow', 'parquet'}
+
+
+def reading_dict(r) -> dict:
+    """JSON-ready dict for a Reading ORM object"""
+    return {
+        'id': r.id,
+        'sensor_id': r.sensor_id,
+        'farm_id': r.farm_id,
+        'ts': str(r.ts),
+        'temperature': r.temperature,
+        'humidity': r.humidity,
+        'ph': r.ph,
+        'rainfall': r.rainfall,
+        'n': r.n,
+        'p': r.p,
+        'k': r.k,
+        'label': r.label
+    }
+
+
+def csv_chunks(chunks, columns):
+    """Yield a CSV header, then one CSV-encoded block per chunk"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def ndjson_chunks(chunks, columns):
+    """Yield one newline-delimited JSON block per chunk"""
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=_json_default) + '\n' for row in rows)
+
+
+# ============ Columnar formats (pyarrow) ============
+
+def arrow_schema(columns):
+    """Arrow schema for a projection of the readings columns"""
+    import pyarrow as pa
+    types = {
+        'id': pa.int64(),
+        'sensor_id': pa.string(),
+        'farm_id': pa.int32(),
+        'ts': pa.timestamp('us', tz='UTC'),
+        'temperature': pa.float64(),
+        'humidity': pa.float64(),
+        'ph': pa.float64(),
+        'rainfall': pa.float64(),
+        'n': pa.int32(),
+        'p': pa.int32(),
+        'k': pa.int32(),
+        'label': pa.string()
+    }
+    return pa.schema([(c, types[c]) for c in columns])
+
+
+def _record_batch(rows, schema):
+    import pyarrow as pa
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller"""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def arrow_chunks(chunks, columns):
+    """Yield an Arrow IPC stream with one record batch per chunk"""
+    import pyarrow as pa
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for rows in chunks:
+            writer.write_batch(_record_batch(rows, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def parquet_chunks(chunks, columns):
+    """Yield a Parquet file with one row group per chunk; the footer comes last"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_batches([_record_batch(rows, schema)]))
+            yield sink.drain()
+    yield sink.drain()
+
+
+WRITERS = {
+    'csv': csv_chunks,
+    'ndjson': ndjson_chunks,
+    'arrow': arrow_chunks,
+    'parquet': parquet_chunks
+}
@@ -0,0 +1,107 @@
+"""
+Compiled RandomForest inference without scikit-learn.
+
+``ml/train.py`` exports a fitted RandomForestClassifier next to its joblib
+file as ``<stem>.forest/``: every tree's nodes concatenated into flat NumPy
+arrays plus a ``meta.json``. ``CompiledForest`` walks all trees for all rows
+at once, one vectorized step per tree level, and reproduces sklearn's
+``predict_proba`` arithmetic (float32 features, ``<=`` splits, per-tree
+normalized leaf values summed in tree order, divided by the tree count).
+
+Nodes are stored in pre-order, so a split node's left child is always the
+next node and only the right child index is stored. Leaf nodes split on
+-inf and point right to themselves: a row that reached a leaf stays there,
+and traversal stops once no row moved during a step.
+"""
+import json
+import os
+import numpy as np
+
+ARRAYS = ['feature', 'threshold', 'right', 'value', 'roots']
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+
+def forest_dir(model_path: str) -> str:
+    """Directory holding the compiled export of a model file"""
+    return os.path.splitext(model_path)[0] + '.forest'
+
+
+def export_mtime(directory: str):
+    """mtime of a compiled export (its meta.json, written last), or None if there is none"""
+    try:
+        return os.stat(os.path.join(directory, META_FILE)).st_mtime
+    except OSError:
+        return None
+
+
+class CompiledForest:
+    """
+    Drop-in replacement for a fitted RandomForestClassifier at serve time
+
+    Exposes ``classes_``, ``predict_proba`` and ``predict`` so the predictor
+    module can use it unchanged.
+    """
+
+    def __init__(self, feature, threshold, right, value, roots, classes, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """
+        Load a compiled export
+
+        With mmap=True the node arrays are memory-mapped read-only, so every
+        worker process serving the same export shares one page-cached copy.
+        """
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled forest format {meta.get('format_version')!r} in {directory}")
+        mmap_mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(classes=meta['classes'], max_depth=meta['max_depth'], n_features=meta['n_features'], **arrays)
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index reached in every tree, shape (n_rows, n_trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'Expected {self.n_features_in_} features, got shape {X.shape}')
+        if not np.isfinite(X).all():
+            raise ValueError('Input contains NaN or infinity')
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        # offset of each (row, tree) pair's row in the flattened matrix
+        base = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees)
+        node = np.tile(self.roots, n_rows)
+        for _ in range(self.max_depth):
+            go_left = flat[base + self.feature[node]] <= self.threshold[node]
+            moved = np.where(go_left, node + 1, self.right[node])
+            if np.array_equal(moved, node):
+                break
+            node = moved
+        return node.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        # add the trees in order into one (n_rows, n_classes) buffer, like sklearn,
+        # rather than gathering a (n_trees, n_rows, n_classes) temporary
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]))
+        for tree in range(self.n_trees):
+            proba += self.value[leaves[:, tree]]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
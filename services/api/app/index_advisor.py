@@ -0,0 +1,113 @@
+"""
+Indexes for the readings hypertable and an EXPLAIN ANALYZE regression check.
+
+The composite indexes that back the hot crud queries are created by
+``app/migrations/0003_readings_indexes.sql``. ``check_queries`` runs EXPLAIN
+ANALYZE on those queries and flags any plan that falls back to a sequential
+scan over a large readings chunk (plain or compressed).
+
+Run as a CI/deploy check (exits 1 when a query regressed):
+
+    python -m app.index_advisor
+"""
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import models, crud
+
+logger = logging.getLogger(__name__)
+
+# a sequential scan reading fewer rows than this is not worth flagging
+DEFAULT_MIN_SCANNED_ROWS = 10000
+
+
+def hot_queries(db: Session):
+    """The crud queries worth guarding, with representative parameters"""
+    farm_id = db.execute(select(models.Reading.farm_id).where(models.Reading.farm_id.isnot(None)).limit(1)).scalar() or 1
+    sensor_id = db.execute(select(models.Reading.sensor_id).where(models.Reading.sensor_id.isnot(None)).limit(1)).scalar() or ''
+    week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    return {
+        'latest_reading_for_farm': crud.latest_reading_for_farm_query(farm_id),
+        'filtered_by_farm': crud.readings_filtered_query(farm_id=farm_id, start_date=week_ago, temp_min=20, temp_max=30),
+        'filtered_by_sensor': crud.readings_filtered_query(sensor_id=sensor_id, start_date=week_ago),
+        'filtered_by_temperature': crud.readings_filtered_query(temp_min=40, temp_max=60),
+        'recent_readings': select(models.Reading).order_by(models.Reading.ts.desc()).limit(20),
+    }
+
+
+def _scan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _scan_nodes(child)
+
+
+def explain(db: Session, query):
+    """Run EXPLAIN (ANALYZE, VERBOSE, FORMAT JSON) for a SQLAlchemy query and return the plan"""
+    compiled = query.compile(dialect=db.get_bind().dialect)
+    # VERBOSE adds the Schema of each scanned relation, needed to recognise hypertable chunks
+    row = db.connection().exec_driver_sql(f'EXPLAIN (ANALYZE, VERBOSE, FORMAT JSON) {compiled}', compiled.params).scalar()
+    return (json.loads(row) if isinstance(row, str) else row)[0]
+
+
+def check_queries(db: Session, min_scanned_rows: int = DEFAULT_MIN_SCANNED_ROWS):
+    """
+    EXPLAIN ANALYZE every hot query and flag sequential scans on readings
+
+    Args:
+        db: Database session
+        min_scanned_rows: Ignore sequential scans that read fewer rows
+
+    Returns:
+        List of dicts with query name, execution time, index scans used and
+        any sequential scans over readings (or its plain or compressed chunks)
+    """
+    report = []
+    for name, query in hot_queries(db).items():
+        plan = explain(db, query)
+        seq_scans = []
+        indexes = set()
+        for node in _scan_nodes(plan['Plan']):
+            relation = node.get('Relation Name', '')
+            if node.get('Index Name'):
+                indexes.add(node['Index Name'])
+            if node.get('Node Type') != 'Seq Scan':
+                continue
+            # chunks of readings live in _timescaledb_internal: _hyper_* when
+            # uncompressed, compress_hyper_* once compressed
+            if relation != 'readings' and node.get('Schema') != '_timescaledb_internal':
+                continue
+            scanned = (node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * node.get('Actual Loops', 1)
+            if scanned >= min_scanned_rows:
+                seq_scans.append({'relation': relation, 'rows_scanned': scanned})
+        report.append({
+            'query': name,
+            'execution_time_ms': plan.get('Execution Time'),
+            'indexes_used': sorted(indexes),
+            'seq_scans': seq_scans,
+            'regressed': bool(seq_scans)
+        })
+    db.rollback()
+    return report
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        report = check_queries(db)
+    finally:
+        db.close()
+    for entry in report:
+        status = 'SEQ SCAN' if entry['regressed'] else 'ok'
+        print(f"{entry['query']:<26} {status:<9} {entry['execution_time_ms']:>9.2f} ms  indexes={','.join(entry['indexes_used']) or '-'}")
+        for scan in entry['seq_scans']:
+            print(f"    sequential scan on {scan['relation']} ({scan['rows_scanned']} rows)")
+    return 1 if any(entry['regressed'] for entry in report) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Bulk ingest engine for the readings hypertable.
+
+Rows are encoded as CSV in memory and streamed into ``readings`` with
+``COPY ... FROM STDIN`` over the session's psycopg2 connection, one
+transaction per batch; farm_latest/sensor_latest are upserted and the
+per-sensor anomaly statistics advanced in the same transaction (see
+app.latest and app.anomaly). A failed batch is rolled back and reported without
+affecting the batches around it. Non-PostgreSQL databases fall back to an
+executemany INSERT.
+"""
+import csv
+import io
+import itertools
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app import models, latest, anomaly
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+COPY_COLUMNS = ['ts', 'sensor_id', 'farm_id', 'temperature', 'humidity', 'ph', 'rainfall', 'n', 'p', 'k', 'label']
+COPY_SQL = f"COPY readings ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+
+def _batches(readings, batch_size: int):
+    it = iter(readings)
+    while True:
+        batch = list(itertools.islice(it, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _row(reading, now_iso: str):
+    return (
+        reading.ts.isoformat() if reading.ts else now_iso,
+        reading.sensor_id,
+        reading.farm_id,
+        reading.temperature,
+        reading.humidity,
+        reading.ph,
+        reading.rainfall,
+        reading.n,
+        reading.p,
+        reading.k,
+        reading.label
+    )
+
+
+def _copy_batch(db: Session, batch, now: datetime):
+    # COPY cannot fall back to the column default per row, so fill ts here
+    now_iso = now.isoformat()
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    # None is written as an unquoted empty field, which COPY reads as NULL
+    writer.writerows(_row(r, now_iso) for r in batch)
+    buf.seek(0)
+    with db.connection().connection.cursor() as cur:
+        cur.copy_expert(COPY_SQL, buf)
+
+
+def _insert_batch(db: Session, batch, now: datetime):
+    rows = [{c: getattr(r, c) for c in COPY_COLUMNS} for r in batch]
+    for row in rows:
+        row['ts'] = row['ts'] or now
+    db.execute(insert(models.Reading), rows)
+
+
+def copy_readings(db: Session, readings, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Insert readings in batches, one COPY and one commit per batch
+
+    Args:
+        db: Database session
+        readings: Iterable of ReadingIn-like objects (consumed lazily)
+        batch_size: Rows per COPY/transaction
+
+    Returns:
+        Tuple of (successful_count, failed_count, errors)
+    """
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    write_batch = _copy_batch if db.get_bind().dialect.name == 'postgresql' else _insert_batch
+    now = datetime.now(timezone.utc)
+
+    successful = 0
+    failed = 0
+    errors = []
+    for batch_no, batch in enumerate(_batches(readings, batch_size)):
+        try:
+            write_batch(db, batch, now)
+            latest.record(db, batch, now)
+            anomaly.record(db, batch, now)
+            db.commit()
+            successful += len(batch)
+        except Exception as e:
+            db.rollback()
+            failed += len(batch)
+            errors.append({
+                'batch': batch_no,
+                'error': str(e),
+                'rows_affected': len(batch)
+            })
+            logger.error(f"Batch {batch_no} failed: {e}")
+
+    return successful, failed, errors
+
+
+# ============ CSV uploads ============
+
+# Same column name variations the dashboard's Data Upload tab accepts
+COLUMN_ALIASES = {
+    'temperature': ['temp', 'temp_c', 'Temperature', 'Temp'],
+    'humidity': ['Humidity', 'Humid'],
+    'ph': ['PH', 'pH', 'Ph'],
+    'rainfall': ['Rainfall', 'Rain', 'Precipit'],
+    'n': ['N', 'Nitrogen', 'NPK_N'],
+    'p': ['P', 'Phosphorus', 'NPK_P'],
+    'k': ['K', 'Potassium', 'NPK_K'],
+    'sensor_id': ['Sensor_ID', 'sensor', 'Sensor', 'SensorID'],
+    'farm_id': ['Farm_ID', 'farm', 'Farm', 'FarmID'],
+    'ts': ['timestamp', 'Timestamp'],
+    'label': ['Label', 'crop', 'Crop']
+}
+REQUIRED_COLUMNS = ['temperature', 'humidity', 'ph', 'rainfall', 'n', 'p', 'k']
+
+CsvReading = namedtuple('CsvReading', COPY_COLUMNS)
+
+
+def map_columns(header):
+    """
+    Map CSV header names onto reading fields (case-insensitive, with aliases)
+
+    Returns:
+        Tuple of ({field: column_index}, [missing required fields])
+    """
+    lowered = [h.strip().lower() for h in header]
+    mapping = {}
+    for field, variations in COLUMN_ALIASES.items():
+        for name in [field] + variations:
+            if name.lower() in lowered:
+                mapping[field] = lowered.index(name.lower())
+                break
+    missing = [c for c in REQUIRED_COLUMNS if c not in mapping]
+    return mapping, missing
+
+
+def _float(value):
+    value = value.strip()
+    return float(value) if value else None
+
+
+def _int(value):
+    value = value.strip()
+    return int(float(value)) if value else None
+
+
+def _parse_row(row, mapping, row_number: int):
+    def col(field):
+        idx = mapping.get(field)
+        return row[idx] if idx is not None and idx < len(row) else ''
+
+    ts = col('ts').strip()
+    sensor_id = col('sensor_id').strip()
+    farm_id = _int(col('farm_id'))
+    return CsvReading(
+        ts=datetime.fromisoformat(ts) if ts else None,
+        # auto-generate ids the same way the dashboard does when missing
+        sensor_id=sensor_id if 'sensor_id' in mapping else str(row_number),
+        farm_id=farm_id if 'farm_id' in mapping else 1,
+        temperature=_float(col('temperature')),
+        humidity=_float(col('humidity')),
+        ph=_float(col('ph')),
+        rainfall=_float(col('rainfall')),
+        n=_int(col('n')),
+        p=_int(col('p')),
+        k=_int(col('k')),
+        label=col('label').strip() or None
+    )
+
+
+def iter_csv_readings(reader, mapping, result: dict):
+    """
+    Lazily parse CSV rows into readings, recording rows that fail to parse
+
+    Args:
+        reader: csv.reader positioned after the header row
+        mapping: Field to column index mapping from map_columns
+        result: Dict with 'total', 'failed' and 'errors' updated in place
+    """
+    for row_number, row in enumerate(reader, start=1):
+        if not row:
+            continue
+        result['total'] += 1
+        try:
+            yield _parse_row(row, mapping, row_number)
+        except ValueError as e:
+            result['failed'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append({'row': row_number, 'error': str(e)})
+
+
+def ingest_csv_stream(db: Session, binary_file, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Parse a CSV file incrementally and COPY it into readings batch by batch
+
+    Only one batch of rows is held in memory at a time, so memory use does
+    not depend on the file size.
+
+    Args:
+        db: Database session
+        binary_file: Readable binary file object (e.g. UploadFile.file)
+        batch_size: Rows per COPY/transaction
+
+    Returns:
+        Dict with total, successful and failed row counts and errors
+
+    Raises:
+        ValueError: If the header lacks a required column
+    """
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if not header:
+            raise ValueError('CSV file is empty')
+        mapping, missing = map_columns(header)
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}; available columns: {', '.join(header)}")
+
+        result = {'total': 0, 'failed': 0, 'errors': []}
+        successful, failed, batch_errors = copy_readings(
+            db, iter_csv_readings(reader, mapping, result), batch_size=batch_size
+        )
+        return {
+            'total': result['total'],
+            'successful': successful,
+            'failed': result['failed'] + failed,
+            'errors': result['errors'] + batch_errors
+        }
+    finally:
+        # leave the underlying upload file open for its owner to close
+        text.detach()
@@ -0,0 +1,207 @@
+"""
+Write-behind buffer for single-reading /ingest calls.
+
+With INGEST_BUFFER_ENABLED=true, /ingest appends the reading to an
+in-process buffer instead of running its own INSERT/COMMIT/refresh. A
+background thread flushes the buffer every INGEST_BUFFER_FLUSH_MS or as soon
+as INGEST_BUFFER_MAX_ROWS readings are pending, with one COPY and one commit
+per flush (see app.ingest).
+
+Durability modes (INGEST_BUFFER_DURABILITY):
+    commit  the request waits until the flush containing its reading has
+            committed (group commit); a reading that cannot be written
+            fails its own request only
+    ack     the request returns as soon as the reading is queued; readings
+            still in the buffer are lost if the process crashes
+"""
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from app import ingest
+from app.config import settings
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# how long a durability=commit /ingest request waits for its flush
+COMMIT_TIMEOUT_SECONDS = 30
+
+DURABILITY_MODES = ('commit', 'ack')
+
+
+class BufferFull(Exception):
+    """Raised when the buffer holds max_pending readings that are not yet flushed"""
+
+
+class IngestBuffer:
+    """Coalesces readings across requests and flushes them in one transaction"""
+
+    def __init__(self, max_rows: int = 1000, flush_interval_ms: float = 200, max_pending: int = 50000, durability: str = 'commit'):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown ingest buffer durability {durability!r}, expected one of {DURABILITY_MODES}')
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.durability = durability
+        self._cond = threading.Condition()
+        self._pending = []
+        self._first_at = None
+        self._seq = 0
+        self._stopping = False
+        self._thread = None
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.last_flush_ms = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='ingest-buffer', daemon=True)
+        self._thread.start()
+        logger.info(f'Ingest buffer started (max_rows={self.max_rows}, flush_interval={self.flush_interval * 1000:.0f}ms, durability={self.durability})')
+
+    def stop(self, timeout: float = 10):
+        """Flush whatever is pending and stop the background thread"""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, reading):
+        """
+        Queue a reading for the next flush
+
+        Returns:
+            Tuple of (sequence number, Future resolved once the flush that
+            contains this reading has committed)
+
+        Raises:
+            BufferFull: If max_pending readings are already waiting
+        """
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                raise BufferFull(f'{len(self._pending)} readings pending flush')
+            self._seq += 1
+            future = Future()
+            self._pending.append((reading, future))
+            if len(self._pending) == 1:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            elif len(self._pending) >= self.max_rows:
+                self._cond.notify()
+            return self._seq, future
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            deadline = (self._first_at or time.monotonic()) + self.flush_interval
+            while len(self._pending) < self.max_rows and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending
+            self._pending, self._first_at = [], None
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stopping:
+                return
+
+    def _flush(self, batch):
+        start = time.perf_counter()
+        readings = [reading for reading, _ in batch]
+        db = SessionLocal()
+        try:
+            successful, failed, errors = ingest.copy_readings(db, readings, batch_size=len(readings))
+            failed_rows = {}
+            if failed:
+                # one bad reading must not fail the whole group: retry row by row
+                logger.warning(f'Ingest buffer flush of {len(readings)} readings failed, retrying per row: {errors}')
+                successful, failed, errors = ingest.copy_readings(db, readings, batch_size=1)
+                failed_rows = {e['batch']: e['error'] for e in errors}
+        except Exception as e:
+            successful, failed = 0, len(readings)
+            failed_rows = {i: str(e) for i in range(len(readings))}
+        finally:
+            db.close()
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.flushed_rows += successful
+        self.failed_rows += failed
+
+        for i, (_, future) in enumerate(batch):
+            if i in failed_rows:
+                future.set_exception(RuntimeError(failed_rows[i]))
+            else:
+                future.set_result(True)
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'enabled': self._thread is not None,
+            'durability': self.durability,
+            'max_rows': self.max_rows,
+            'flush_interval_ms': self.flush_interval * 1000,
+            'pending': pending,
+            'last_seq': self._seq,
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'failed_rows': self.failed_rows,
+            'avg_batch_rows': (self.flushed_rows + self.failed_rows) / self.flushes if self.flushes else None,
+            'last_flush_ms': self.last_flush_ms
+        }
+
+
+ingest_buffer = IngestBuffer(
+    max_rows=settings.ingest_buffer_max_rows,
+    flush_interval_ms=settings.ingest_buffer_flush_ms,
+    max_pending=settings.ingest_buffer_max_pending,
+    durability=settings.ingest_buffer_durability
+)
+
+
+# ============ /ingest request handling (shared by the sync and async handlers) ============
+
+def submit_reading(reading):
+    """
+    Queue a reading for a buffered /ingest request
+
+    Returns:
+        Tuple of (sequence number, Future to wait on before answering, or
+        None when durability is 'ack')
+
+    Raises:
+        HTTPException: 503 if the buffer is full
+    """
+    try:
+        seq, committed = ingest_buffer.submit(reading)
+    except BufferFull as e:
+        raise HTTPException(status_code=503, detail=f'Ingest buffer full: {e}')
+    return seq, None if ingest_buffer.durability == 'ack' else committed
+
+
+def ingest_failed(error: Exception) -> HTTPException:
+    """Error response for a buffered reading whose flush failed or timed out"""
+    return HTTPException(status_code=500, detail=f'Ingest failed: {error}')
+
+
+def buffered_response(seq: int, committed: Future = None):
+    """Acknowledge a buffered reading: 202 if only queued, 200 once its flush committed"""
+    if committed is None:
+        return JSONResponse({"seq": seq, "status": "queued"}, status_code=202)
+    return JSONResponse({"seq": seq, "status": "committed"})
@@ -0,0 +1,78 @@
+"""
+Last-known state per farm and per sensor.
+
+``farm_latest`` and ``sensor_latest`` hold the most recent reading of each
+farm/sensor. Every ingest path upserts them in the same transaction as the
+readings it writes, so /predict by farm_id is a primary-key lookup instead of
+an ORDER BY ts DESC scan of the hypertable. The upsert only overwrites a row
+with a reading that is at least as new (``WHERE excluded.ts >= ts``), which
+keeps the tables correct when API workers commit out of order.
+
+The tables are created and backfilled by app/migrations/0004_latest_state.sql.
+"""
+from datetime import timezone
+from sqlalchemy.dialects import postgresql, sqlite
+from app import models
+
+FEATURE_COLUMNS = ['temperature', 'humidity', 'ph', 'rainfall', 'n', 'p', 'k']
+
+def _utc(ts):
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _newest(readings, key: str, now):
+    """Reduce readings to the newest one per key value (later rows win ties)"""
+    newest = {}
+    for r in readings:
+        value = getattr(r, key)
+        if value is None:
+            continue
+        ts = _utc(r.ts) if r.ts else now
+        current = newest.get(value)
+        if current is None or ts >= current[0]:
+            newest[value] = (ts, r)
+    # deterministic key order so concurrent batches lock rows in the same order
+    return [newest[value] for value in sorted(newest)]
+
+
+def _upsert(dialect_name: str, table, key: str, other: str, rows):
+    insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+    stmt = insert(table).values([
+        dict({key: getattr(r, key), other: getattr(r, other), 'ts': ts}, **{c: getattr(r, c) for c in FEATURE_COLUMNS})
+        for ts, r in rows
+    ])
+    columns = ['ts', other] + FEATURE_COLUMNS
+    return stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={c: stmt.excluded[c] for c in columns},
+        where=stmt.excluded.ts >= table.c.ts
+    )
+
+
+def upsert_statements(dialect_name: str, readings, now):
+    """
+    Build the farm_latest/sensor_latest upserts for a batch of readings
+
+    Args:
+        dialect_name: 'postgresql' or 'sqlite' (both support ON CONFLICT)
+        readings: Reading-like objects; a missing ts is taken as ``now``
+        now: Timestamp used for readings without ts
+
+    Returns:
+        List of insert statements to execute in the ingest transaction
+    """
+    now = _utc(now)
+    statements = []
+    farms = _newest(readings, 'farm_id', now)
+    if farms:
+        statements.append(_upsert(dialect_name, models.FarmLatest.__table__, 'farm_id', 'sensor_id', farms))
+    sensors = _newest(readings, 'sensor_id', now)
+    if sensors:
+        statements.append(_upsert(dialect_name, models.SensorLatest.__table__, 'sensor_id', 'farm_id', sensors))
+    return statements
+
+
+def record(db, readings, now):
+    """Upsert the latest state for readings written on a sync session"""
+    for stmt in upsert_statements(db.get_bind().dialect.name, readings, now):
+        db.execute(stmt)
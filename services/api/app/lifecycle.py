@@ -0,0 +1,196 @@
+"""
+API start-up lifecycle: schema, connection pool priming and model warmup.
+
+Nothing touches the database at import time any more. The startup event runs
+the phases below in order and records how long each one took, and the worker
+only reports ready (GET /health/ready) once they have finished:
+
+    schema        check that all migrations in app/migrations are applied
+                  (DDL runs once per deploy in python -m app.migrate)
+    pool          open DB_POOL_SIZE connections so the first requests do
+                  not pay for connection set-up
+    model         load the active model into the model cache
+    warmup        run a few dummy inferences so lazy initialisation (page
+                  faults on memory-mapped arrays, sklearn validation paths)
+                  happens before traffic arrives
+    ingest_buffer start the write-behind buffer if enabled
+    async_pool    prime the asyncpg pool (API_ASYNC_MODE only)
+"""
+import time
+import logging
+from contextlib import contextmanager
+import numpy as np
+from sqlalchemy import text
+from app import predictor, migrate
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.ingest_buffer import ingest_buffer
+from app.model_cache import model_cache
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ROUNDS = 3
+
+
+class StartupState:
+    """Phase timings and readiness of this worker"""
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self.phases = {}
+        self.ready = False
+        self.ready_after_ms = None
+        self.model_loaded = False
+        self.pending_migrations = []
+        self.error = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (time.perf_counter() - start) * 1000
+            logger.info(f'Startup phase {name} took {self.phases[name]:.1f}ms')
+
+    def mark_ready(self):
+        self.ready = True
+        self.ready_after_ms = (time.perf_counter() - self.created_at) * 1000
+        logger.info(f'API ready {self.ready_after_ms:.1f}ms after import ({", ".join(f"{k}={v:.0f}ms" for k, v in self.phases.items())})')
+
+    def report(self):
+        return {
+            'ready': self.ready,
+            'ready_after_ms': self.ready_after_ms,
+            'model_loaded': self.model_loaded,
+            'pending_migrations': list(self.pending_migrations),
+            'phases_ms': dict(self.phases),
+            'error': self.error
+        }
+
+
+startup_state = StartupState()
+
+
+def check_schema():
+    """
+    Compare the applied migrations with the ones shipped in app/migrations
+
+    The API does not run DDL; schema changes are applied once per deploy by
+    ``python -m app.migrate`` (unless MIGRATE_ON_STARTUP is set).
+
+    Returns:
+        List of pending migration versions (empty when the schema is current)
+    """
+    if settings.migrate_on_startup:
+        migrate.upgrade()
+    with engine.connect() as conn:
+        pending = migrate.pending_versions(conn)
+    if pending:
+        logger.error(f'Database schema is behind: pending migrations {", ".join(pending)}; run python -m app.migrate')
+    return pending
+
+
+def prime_pool():
+    """Open pool_size connections at once so they stay idle in the pool"""
+    size = engine.pool.size() if hasattr(engine.pool, 'size') else 0
+    connections = []
+    try:
+        for _ in range(size):
+            conn = engine.connect()
+            connections.append(conn)
+            conn.execute(text('SELECT 1'))
+    finally:
+        for conn in connections:
+            conn.close()
+    return size
+
+
+def warm_model():
+    """
+    Load the active model into model_cache (no inference; see run_warmup)
+
+    Returns:
+        The loaded model, or None if none could be loaded (demo mode)
+    """
+    db = SessionLocal()
+    try:
+        model = model_cache.get(db)
+    finally:
+        db.close()
+    if model is None:
+        logger.warning('No model could be loaded; /predict will serve demo predictions')
+        return None
+    return model
+
+
+def run_warmup(model):
+    x = np.zeros((1, len(predictor.FEATURE_ORDER)), dtype=np.float64)
+    for _ in range(WARMUP_ROUNDS):
+        predictor.top_k_predictions(model, x, 5)
+
+
+def run_startup():
+    """Run the synchronous start-up phases (called from the startup event)"""
+    state = startup_state
+    with state.phase('schema'):
+        state.pending_migrations = check_schema()
+    with state.phase('pool'):
+        prime_pool()
+    try:
+        with state.phase('model'):
+            model = warm_model()
+        if model is not None:
+            with state.phase('warmup'):
+                run_warmup(model)
+        state.model_loaded = model is not None
+    except Exception as e:
+        # a broken model must not keep the worker from serving ingest/data endpoints
+        state.error = f'Model warmup failed: {e}'
+        logger.error(state.error)
+    if settings.ingest_buffer_enabled:
+        with state.phase('ingest_buffer'):
+            ingest_buffer.start()
+
+
+async def prime_async_pool():
+    """Open pool_size asyncpg connections (API_ASYNC_MODE only)"""
+    from app.async_database import async_engine
+    pool = async_engine.pool
+    size = pool.size() if hasattr(pool, 'size') else 0
+    connections = []
+    try:
+        for _ in range(size):
+            conn = await async_engine.connect()
+            connections.append(conn)
+            await conn.execute(text('SELECT 1'))
+    finally:
+        for conn in connections:
+            await conn.close()
+
+
+def check_ready():
+    """
+    Readiness of this worker
+
+    Returns:
+        Tuple of (ready, details); ready requires completed start-up, a
+        database round trip and no pending migrations
+    """
+    details = startup_state.report()
+    if not startup_state.ready:
+        return False, details
+    try:
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            if startup_state.pending_migrations:
+                # re-checked until the migrate run has caught up
+                startup_state.pending_migrations = migrate.pending_versions(conn)
+        details['database'] = 'ok'
+    except Exception as e:
+        details['database'] = f'unavailable: {e}'
+        return False, details
+    details['pending_migrations'] = list(startup_state.pending_migrations)
+    if startup_state.pending_migrations:
+        return False, details
+    return True, details
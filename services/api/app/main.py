@@ -1,19 +1,27 @@
 from fastapi import FastAPI, Depends, HTTPException, File, UploadFile
+from fastapi.routing import APIRoute
 from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import text, func
-from app.database import SessionLocal, engine
-from app import models, crud
+from app.database import SessionLocal, engine, pool_status
+from app import models, crud, predictor, export, index_advisor, lifecycle, rollup, storage, downsample, anomaly, analytics
 from app.schemas import (
     ReadingIn, PredictRequest, PredictResponse, Health, ModelIn, ModelOut,
     BulkIngestRequest, BulkIngestResponse, DataStatsResponse,
-    PredictBatchRequest, PredictBatchResponse, CropInfo, FilteredReadingsRequest
+    PredictBatchRequest, PredictBatchResponse, CropInfo, FilteredReadingsRequest, ShadowConfigIn,
+    FilteredReadingsResponse, RollupResponse, SeriesResponse
 )
 from app.config import settings
-import joblib
-import numpy as np
-import io
+from app.model_cache import model_cache
+from app.cache import TTLSnapshot, prediction_cache, analytics_cache
+from app.ingest_buffer import ingest_buffer, submit_reading, ingest_failed, buffered_response, COMMIT_TIMEOUT_SECONDS
+from app.ingest import ingest_csv_stream
+from app.shadow import shadow_evaluator
+import json
 import logging
+import time
+from datetime import datetime
 from typing import List
 
 # Setup logging
@@ -22,35 +30,8 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title='smart-agri-api')
 
-# create tables metadata (note: in production use migrations)
-models.Base.metadata.create_all(bind=engine)
-
-# ensure models table exists with desired columns (id,name,path,version,accuracy,model_metadata,active,created_at)
-with engine.connect() as conn:
-    conn.execute(text('''
-    CREATE TABLE IF NOT EXISTS models (
-        id SERIAL PRIMARY KEY,
-        name TEXT NOT NULL,
-        path TEXT NOT NULL,
-        version TEXT,
-        accuracy DOUBLE PRECISION,
-        model_metadata JSONB,
-        active BOOLEAN DEFAULT FALSE,
-        created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
-    );
-    '''))
-
-    # ensure columns exist (Postgres supports IF NOT EXISTS in ADD COLUMN from newer versions)
-    try:
-        conn.execute(text("ALTER TABLE models ADD COLUMN IF NOT EXISTS version TEXT;"))
-        conn.execute(text("ALTER TABLE models ADD COLUMN IF NOT EXISTS accuracy DOUBLE PRECISION;"))
-        conn.execute(text("ALTER TABLE models ADD COLUMN IF NOT EXISTS model_metadata JSONB;"))
-        conn.execute(text("ALTER TABLE models ADD COLUMN IF NOT EXISTS active BOOLEAN DEFAULT FALSE;"))
-        conn.execute(text("ALTER TABLE models ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE DEFAULT now();"))
-    except Exception:
-        pass
-    conn.commit()
-
+# /data/stats is polled by every dashboard session; compute it at most once per TTL
+stats_snapshot = TTLSnapshot(settings.stats_cache_ttl_seconds)
 
 # dependency
 def get_db():
@@ -64,22 +45,80 @@ def get_db():
 def health():
     return {'status': 'ok'}
 
+@app.get('/health/live', response_model=Health)
+def health_live():
+    """Liveness: the process is up and serving requests"""
+    return {'status': 'ok'}
+
+@app.get('/health/ready')
+def health_ready():
+    """Readiness: start-up finished (model warmed, pool primed), the database answers and its schema is current"""
+    ready, details = lifecycle.check_ready()
+    if ready:
+        status = 'ready'
+    else:
+        status = 'migrations_pending' if details.get('pending_migrations') else 'starting'
+    return JSONResponse(dict(details, status=status), status_code=200 if ready else 503)
+
+@app.get('/metrics/startup')
+def startup_metrics():
+    """Duration of each start-up phase of this worker"""
+    return lifecycle.startup_state.report()
+
+@app.on_event('startup')
+async def startup():
+    await run_in_threadpool(lifecycle.run_startup)
+    if settings.api_async_mode:
+        with lifecycle.startup_state.phase('async_pool'):
+            await lifecycle.prime_async_pool()
+    lifecycle.startup_state.mark_ready()
+
+@app.on_event('shutdown')
+def stop_ingest_buffer():
+    # flush readings that are still buffered before the worker exits
+    ingest_buffer.stop()
+
+@app.on_event('shutdown')
+def stop_shadow_evaluator():
+    shadow_evaluator.shutdown()
+
 @app.post('/ingest')
 def ingest(reading: ReadingIn, db: Session = Depends(get_db)):
+    if settings.ingest_buffer_enabled:
+        return ingest_buffered(reading)
     r = crud.create_reading(db, reading)
     return JSONResponse({"id": r.id, "ts": str(r.ts)})
 
+def ingest_buffered(reading: ReadingIn):
+    """Queue a reading in the write-behind buffer and acknowledge with its sequence number"""
+    seq, committed = submit_reading(reading)
+    if committed is not None:
+        try:
+            committed.result(timeout=COMMIT_TIMEOUT_SECONDS)
+        except Exception as e:
+            raise ingest_failed(e)
+    return buffered_response(seq, committed)
+
+@app.get('/ingest/buffer/stats')
+def ingest_buffer_stats():
+    """Pending readings, flush counts and sizes of the write-behind buffer"""
+    return ingest_buffer.stats()
+
 @app.post('/models/register', response_model=ModelOut)
 def register_model(model_in: ModelIn, db: Session = Depends(get_db)):
-    m = crud.register_model(db, name=model_in.name, path=model_in.path, version=model_in.version, accuracy=model_in.accuracy, metadata=None if model_in.metadata is None else str(model_in.metadata), activate=bool(model_in.activate))
+    m = crud.register_model(db, name=model_in.name, path=model_in.path, version=model_in.version, accuracy=model_in.accuracy, metadata=None if model_in.metadata is None else json.dumps(model_in.metadata), activate=bool(model_in.activate))
+    if m.active:
+        # hot-swap the cached model so this worker serves the new one immediately
+        model_cache.activate(m)
     return {
         'id': m.id,
         'name': m.name,
         'path': m.path,
         'version': m.version,
         'accuracy': m.accuracy,
-        'metadata': None if not m.model_metadata else m.model_metadata,
+        'metadata': crud.parse_model_metadata(m.model_metadata),
         'active': 1 if m.active else 0,
+        'shadow_fraction': m.shadow_fraction,
         'created_at': m.created_at
     }
 
@@ -94,11 +133,73 @@ def get_latest_model(db: Session = Depends(get_db)):
         'path': m.path,
         'version': m.version,
         'accuracy': m.accuracy,
-        'metadata': None if not m.model_metadata else m.model_metadata,
+        'metadata': crud.parse_model_metadata(m.model_metadata),
         'active': 1 if m.active else 0,
+        'shadow_fraction': m.shadow_fraction,
         'created_at': m.created_at
     }
 
+@app.get('/metrics/db-pool')
+def db_pool_metrics():
+    """Checked-out, idle and overflow connections plus checkout wait times"""
+    metrics = {'sync': pool_status(engine.pool)}
+    if settings.api_async_mode:
+        from app.async_database import async_engine
+        metrics['async'] = pool_status(async_engine.pool)
+    return metrics
+
+@app.get('/models/cache/stats')
+def get_model_cache_stats():
+    """Hit/miss counters and the currently cached model"""
+    return model_cache.stats()
+
+@app.post('/models/cache/invalidate')
+def invalidate_model_cache():
+    """Drop the cached model; the next prediction reloads the active model"""
+    model_cache.invalidate()
+    return {'message': 'Model cache invalidated'}
+
+@app.post('/models/{model_id}/shadow', response_model=ModelOut)
+def set_model_shadow(model_id: int, config: ShadowConfigIn, db: Session = Depends(get_db)):
+    """Score a fraction of live /predict traffic with this model in shadow mode (0 turns it off)"""
+    m = crud.set_shadow_fraction(db, model_id, config.fraction)
+    if m is None:
+        raise HTTPException(status_code=404, detail='Model not found')
+    shadow_evaluator.reload()
+    return {
+        'id': m.id,
+        'name': m.name,
+        'path': m.path,
+        'version': m.version,
+        'accuracy': m.accuracy,
+        'metadata': crud.parse_model_metadata(m.model_metadata),
+        'active': 1 if m.active else 0,
+        'shadow_fraction': m.shadow_fraction,
+        'created_at': m.created_at
+    }
+
+@app.get('/models/shadow/stats')
+def get_shadow_stats():
+    """Per-candidate agreement with the served model and latency percentiles"""
+    return shadow_evaluator.stats()
+
+@app.post('/models/shadow/reset')
+def reset_shadow_stats():
+    """Clear the shadow evaluation counters of this worker"""
+    shadow_evaluator.reset()
+    return {'message': 'Shadow statistics reset'}
+
+@app.get('/predict/cache/stats')
+def get_prediction_cache_stats():
+    """Hit rate, size and evictions of the /predict result cache"""
+    return prediction_cache.stats()
+
+@app.post('/predict/cache/invalidate')
+def invalidate_prediction_cache():
+    """Drop all cached /predict results"""
+    prediction_cache.invalidate()
+    return {'message': 'Prediction cache invalidated'}
+
 @app.get('/models/list')
 def list_all_models(db: Session = Depends(get_db)):
     """List all registered models ordered by creation date (newest first)"""
@@ -110,8 +211,9 @@ def list_all_models(db: Session = Depends(get_db)):
             'path': m.path,
             'version': m.version,
             'accuracy': m.accuracy,
-            'metadata': None if not m.model_metadata else m.model_metadata,
+            'metadata': crud.parse_model_metadata(m.model_metadata),
             'active': bool(m.active),
+            'shadow_fraction': m.shadow_fraction,
             'created_at': m.created_at
         }
         for m in models_list
@@ -123,68 +225,39 @@ def predict(req: PredictRequest, db: Session = Depends(get_db)):
     if req.features:
         feats = req.features
     elif req.farm_id:
-        r = crud.get_latest_reading_for_farm(db, req.farm_id)
+        r = crud.get_latest_state_for_farm(db, req.farm_id)
         if not r:
             raise HTTPException(status_code=404, detail='No readings for farm')
-        feats = {
-            'N': r.n or 0,
-            'P': r.p or 0,
-            'K': r.k or 0,
-            'temperature': r.temperature or 0.0,
-            'humidity': r.humidity or 0.0,
-            'ph': r.ph or 0.0,
-            'rainfall': r.rainfall or 0.0
-        }
+        feats = predictor.reading_features(r)
     else:
         raise HTTPException(status_code=400, detail='Provide features or farm_id')
 
     # load model: prefer DB-registered active model, else fall back to configured model path
     try:
-        model = None
-        mrec = crud.get_active_model(db)
-        tried_paths = []
-        if mrec and mrec.path:
-            tried_paths.append(mrec.path)
-            try:
-                model = joblib.load(mrec.path)
-            except Exception:
-                model = None
-        if model is None:
-            # fallback to configured model path
-            tried_paths.append(settings.model_path)
-            try:
-                model = joblib.load(settings.model_path)
-            except Exception:
-                model = None
-        if model is None:
-            # Demo mode: return placeholder predictions if model doesn't exist
-            preds = [
-                {'crop': 'Rice', 'probability': 0.45},
-                {'crop': 'Maize', 'probability': 0.35},
-                {'crop': 'Wheat', 'probability': 0.20}
-            ]
-            return {'predictions': preds}
+        model = model_cache.get(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Failed to load model: {e}')
+    if model is None:
+        # Demo mode: return placeholder predictions if model doesn't exist
+        return {'predictions': predictor.DEMO_PREDICTIONS}
 
-    # order features to match training: N,P,K,temp,humidity,ph,rainfall
-    order = ['N','P','K','temperature','humidity','ph','rainfall']
-    x = np.array([[feats.get(k, 0) for k in order]])
+    try:
+        x = predictor.features_to_matrix(feats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     try:
         # Determine top_k (default to 5 if not provided)
         top_k = int(req.top_k) if getattr(req, 'top_k', None) else 5
-        if hasattr(model, 'predict_proba'):
-            probs = model.predict_proba(x)[0]
-            classes = model.classes_
-            pairs = sorted(zip(classes, probs), key=lambda x: -x[1])[:top_k]
-            preds = [{'crop': str(c), 'probability': float(p)} for c,p in pairs]
-        else:
-            pred = model.predict(x)[0]
-            preds = [{'crop': str(pred), 'probability': 1.0}]
+        start = time.perf_counter()
+        preds, cached = predictor.predict_one(model, model_cache.token(model), x, top_k)
+        # a cache hit says nothing about the served model's latency
+        latency_ms = None if cached else (time.perf_counter() - start) * 1000
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Prediction failed: {e}')
 
+    shadow_evaluator.observe(x, [preds], latency_ms)
+
     return {'predictions': preds}
 
 
@@ -192,10 +265,10 @@ def predict(req: PredictRequest, db: Session = Depends(get_db)):
 @app.post('/ingest/bulk', response_model=BulkIngestResponse)
 def ingest_bulk(request: BulkIngestRequest, db: Session = Depends(get_db)):
     """
-    Bulk ingest readings with batch processing (500 rows/batch)
+    Bulk ingest readings with batch processing (COPY of batch_size rows per transaction)
     
     Args:
-        request: BulkIngestRequest with list of readings
+        request: BulkIngestRequest with list of readings and batch_size
         db: Database session
     
     Returns:
@@ -205,7 +278,8 @@ def ingest_bulk(request: BulkIngestRequest, db: Session = Depends(get_db)):
     start_time = time.time()
     
     try:
-        successful, failed, errors = crud.create_readings_bulk(db, request.readings)
+        successful, failed, errors = crud.create_readings_bulk(db, request.readings, batch_size=request.batch_size)
+        stats_snapshot.invalidate()
         processing_time = (time.time() - start_time) * 1000  # Convert to ms
         
         logger.info(f'Bulk ingest: {successful} successful, {failed} failed in {processing_time:.2f}ms')
@@ -222,17 +296,61 @@ def ingest_bulk(request: BulkIngestRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f'Bulk ingest failed: {str(e)}')
 
 
+@app.post('/ingest/csv', response_model=BulkIngestResponse)
+def ingest_csv(file: UploadFile = File(...), batch_size: int = 5000, db: Session = Depends(get_db)):
+    """
+    Stream a CSV upload into the readings table
+    
+    The file is parsed incrementally and copied into the database in
+    batch_size chunks, so memory use stays constant regardless of file size.
+    Column names are matched with the same aliases the dashboard accepts.
+    
+    Args:
+        file: Multipart CSV upload
+        batch_size: Rows per COPY/transaction
+        db: Database session
+    
+    Returns:
+        BulkIngestResponse with statistics
+    """
+    import time
+    start_time = time.time()
+    
+    try:
+        result = ingest_csv_stream(db, file.file, batch_size=batch_size)
+        stats_snapshot.invalidate()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f'CSV ingest failed: {e}')
+        raise HTTPException(status_code=500, detail=f'CSV ingest failed: {str(e)}')
+    processing_time = (time.time() - start_time) * 1000
+    
+    logger.info(f"CSV ingest of {file.filename}: {result['successful']} successful, {result['failed']} failed in {processing_time:.2f}ms")
+    
+    return {
+        'total_rows': result['total'],
+        'successful_rows': result['successful'],
+        'failed_rows': result['failed'],
+        'errors': result['errors'] if result['errors'] else None,
+        'processing_time_ms': processing_time
+    }
+
+
 # ============ PRIORITY 2: GET /data/stats - Data Statistics ============
 @app.get('/data/stats', response_model=DataStatsResponse)
 def get_data_stats(db: Session = Depends(get_db)):
     """
     Get aggregate statistics about sensor data
     
+    Served from a short-lived snapshot (STATS_CACHE_TTL_SECONDS) so concurrent
+    dashboard sessions trigger at most one database computation per interval.
+    
     Returns:
         DataStatsResponse with comprehensive statistics
     """
     try:
-        stats = crud.get_data_statistics(db)
+        stats = stats_snapshot.get(lambda: crud.get_data_statistics(db))
         return stats
     except Exception as e:
         logger.error(f'Failed to get data stats: {e}')
@@ -257,62 +375,31 @@ def predict_batch(request: PredictBatchRequest, db: Session = Depends(get_db)):
     
     try:
         # Load model
-        model = None
-        mrec = crud.get_active_model(db)
-        
-        if mrec and mrec.path:
-            try:
-                model = joblib.load(mrec.path)
-            except Exception:
-                model = None
-        
-        if model is None:
-            try:
-                model = joblib.load(settings.model_path)
-            except Exception:
-                model = None
+        model = model_cache.get(db)
         
         if model is None:
             raise HTTPException(status_code=500, detail='No model available')
         
-        # Process all readings
-        predictions = []
-        failed = 0
-        order = ['N','P','K','temperature','humidity','ph','rainfall']
+        # Score all readings as one feature matrix in a single predict_proba call
+        readings = request.readings
+        x = predictor.readings_to_matrix(readings)
+        score_start = time.perf_counter()
+        row_preds, errors = predictor.predict_rows(model, x, request.top_k or 5)
+        scored_rows = sorted(row_preds)
+        shadow_evaluator.observe(x[scored_rows], [row_preds[i] for i in scored_rows], (time.perf_counter() - score_start) * 1000)
+        for err in errors:
+            logger.error(f"Row {err['row_index']} prediction failed: {err['error']}")
         
-        for i, reading in enumerate(request.readings):
-            try:
-                feats = {
-                    'N': reading.n or 0,
-                    'P': reading.p or 0,
-                    'K': reading.k or 0,
-                    'temperature': reading.temperature or 0.0,
-                    'humidity': reading.humidity or 0.0,
-                    'ph': reading.ph or 0.0,
-                    'rainfall': reading.rainfall or 0.0
-                }
-                
-                x = np.array([[feats.get(k, 0) for k in order]])
-                top_k = request.top_k or 5
-                
-                if hasattr(model, 'predict_proba'):
-                    probs = model.predict_proba(x)[0]
-                    classes = model.classes_
-                    pairs = sorted(zip(classes, probs), key=lambda x: -x[1])[:top_k]
-                    preds = [{'crop': str(c), 'probability': float(p)} for c,p in pairs]
-                else:
-                    pred = model.predict(x)[0]
-                    preds = [{'crop': str(pred), 'probability': 1.0}]
-                
-                predictions.append({
-                    'row_index': i,
-                    'sensor_id': reading.sensor_id,
-                    'farm_id': reading.farm_id,
-                    'predictions': preds
-                })
-            except Exception as e:
-                failed += 1
-                logger.error(f'Row {i} prediction failed: {e}')
+        predictions = [
+            {
+                'row_index': i,
+                'sensor_id': readings[i].sensor_id,
+                'farm_id': readings[i].farm_id,
+                'predictions': preds
+            }
+            for i, preds in sorted(row_preds.items())
+        ]
+        failed = len(errors)
         
         processing_time = (time.time() - start_time) * 1000
         
@@ -322,6 +409,7 @@ def predict_batch(request: PredictBatchRequest, db: Session = Depends(get_db)):
             'predictions': predictions,
             'processed_rows': len(predictions),
             'failed_rows': failed,
+            'errors': errors if errors else None,
             'processing_time_ms': processing_time
         }
     except Exception as e:
@@ -330,18 +418,26 @@ def predict_batch(request: PredictBatchRequest, db: Session = Depends(get_db)):
 
 
 # ============ PRIORITY 4: GET /data/filtered - Advanced Filtering ============
-@app.post('/data/filtered')
+@app.post('/data/filtered', response_model=FilteredReadingsResponse)
 def get_filtered_data(request: FilteredReadingsRequest, db: Session = Depends(get_db)):
     """
-    Get filtered readings with multiple criteria
+    Get filtered readings with multiple criteria, newest first
+    
+    Pages are keyset-paginated on (ts, id): pass the returned next_cursor
+    as cursor to fetch the following page.
     
     Args:
         request: FilteredReadingsRequest with filter criteria
         db: Database session
     
     Returns:
-        List of filtered readings
+        FilteredReadingsResponse with one page of readings
     """
+    try:
+        cursor = crud.decode_cursor(request.cursor) if request.cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         readings = crud.get_readings_filtered(
             db,
@@ -351,85 +447,216 @@ def get_filtered_data(request: FilteredReadingsRequest, db: Session = Depends(ge
             end_date=request.end_date,
             temp_min=request.temp_min,
             temp_max=request.temp_max,
-            limit=request.limit
+            limit=request.limit,
+            cursor=cursor
         )
         
-        return [
-            {
-                'id': r.id,
-                'sensor_id': r.sensor_id,
-                'farm_id': r.farm_id,
-                'ts': str(r.ts),
-                'temperature': r.temperature,
-                'humidity': r.humidity,
-                'ph': r.ph,
-                'rainfall': r.rainfall,
-                'n': r.n,
-                'p': r.p,
-                'k': r.k
-            }
-            for r in readings
-        ]
+        return {
+            'readings': [export.reading_dict(r) for r in readings],
+            'next_cursor': crud.next_page_cursor(readings, request.limit)
+        }
     except Exception as e:
         logger.error(f'Failed to get filtered data: {e}')
         raise HTTPException(status_code=500, detail=f'Failed to get filtered data: {str(e)}')
 
 
+@app.get('/data/rollup', response_model=RollupResponse)
+def data_rollup(
+    start: datetime = None,
+    end: datetime = None,
+    farm_id: int = None,
+    sensor_id: str = None,
+    max_points: int = rollup.DEFAULT_MAX_POINTS,
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Time-bucketed avg/min/max/count of readings for charts over long ranges
+    
+    Reads the coarsest continuous aggregate (1 minute, 1 hour or 1 day
+    buckets) that returns at most max_points buckets for [start, end), so
+    a year-long chart costs a few hundred pre-aggregated rows. fields is an
+    optional comma-separated list of features (e.g. fields=temperature,humidity).
+    """
+    if not 1 <= max_points <= rollup.MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f'max_points must be between 1 and {rollup.MAX_POINTS}')
+    features = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    try:
+        return rollup.get_rollup(db, start=start, end=end, farm_id=farm_id, sensor_id=sensor_id,
+                                 max_points=max_points, features=features)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f'Failed to get rollup: {e}')
+        raise HTTPException(status_code=500, detail=f'Failed to get rollup: {str(e)}')
+
+
+@app.get('/data/series', response_model=SeriesResponse)
+def data_series(
+    field: str,
+    start: datetime = None,
+    end: datetime = None,
+    farm_id: int = None,
+    sensor_id: str = None,
+    max_points: int = downsample.DEFAULT_MAX_POINTS,
+    method: str = 'lttb',
+    source: str = 'auto',
+    db: Session = Depends(get_db)
+):
+    """
+    One field over a time range, downsampled to about max_points points
+    
+    method=lttb keeps the visual shape (Largest-Triangle-Three-Buckets),
+    method=minmax keeps the minimum and maximum per time bucket. Short
+    ranges are read from raw readings, long ones from the rollup views.
+    """
+    if not 3 <= max_points <= downsample.MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f'max_points must be between 3 and {downsample.MAX_POINTS}')
+    try:
+        return downsample.get_series(db, field, start=start, end=end, farm_id=farm_id, sensor_id=sensor_id,
+                                     max_points=max_points, method=method, source=source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f'Failed to get series: {e}')
+        raise HTTPException(status_code=500, detail=f'Failed to get series: {str(e)}')
+
+
+@app.get('/anomalies')
+def list_anomalies(
+    start: datetime = None,
+    end: datetime = None,
+    farm_id: int = None,
+    sensor_id: str = None,
+    field: str = None,
+    min_zscore: float = None,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    Anomalies detected on ingest against each sensor's rolling statistics, newest first
+    
+    start/end filter on the reading time; field is one of the seven features.
+    """
+    if field is not None and field not in crud.READING_FEATURES:
+        raise HTTPException(status_code=400, detail=f"Unknown field '{field}', expected one of {crud.READING_FEATURES}")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail='limit must be between 1 and 1000')
+    try:
+        rows = anomaly.get_anomalies(db, start=start, end=end, farm_id=farm_id, sensor_id=sensor_id,
+                                     field=field, min_zscore=min_zscore, limit=limit)
+    except Exception as e:
+        logger.error(f'Failed to get anomalies: {e}')
+        raise HTTPException(status_code=500, detail=f'Failed to get anomalies: {str(e)}')
+    return {'count': len(rows), 'anomalies': rows}
+
+
+@app.get('/anomalies/sensors/{sensor_id}')
+def sensor_anomaly_stats(sensor_id: str, db: Session = Depends(get_db)):
+    """Current rolling mean/std and sample count of every feature of a sensor"""
+    stats = anomaly.get_sensor_stats(db, sensor_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f'No statistics for sensor {sensor_id}')
+    return stats
+
+
+@app.get('/analytics/correlation')
+def analytics_correlation(start: datetime = None, end: datetime = None, farm_id: int = None, db: Session = Depends(get_db)):
+    """
+    Pearson correlation between every pair of features over [start, end)
+    
+    Computed with corr() over all matching readings and cached per window.
+    """
+    try:
+        return analytics.correlation(db, start=start, end=end, farm_id=farm_id)
+    except Exception as e:
+        logger.error(f'Failed to compute correlations: {e}')
+        raise HTTPException(status_code=500, detail=f'Failed to compute correlations: {str(e)}')
+
+
+@app.get('/analytics/farms')
+def analytics_farms(start: datetime = None, end: datetime = None, db: Session = Depends(get_db)):
+    """
+    Per-farm reading and sensor counts and feature avg/min/max over [start, end)
+    
+    One GROUP BY farm_id over all matching readings, cached per window.
+    """
+    try:
+        return analytics.farm_summary(db, start=start, end=end)
+    except Exception as e:
+        logger.error(f'Failed to compute farm summary: {e}')
+        raise HTTPException(status_code=500, detail=f'Failed to compute farm summary: {str(e)}')
+
+
+@app.get('/analytics/cache/stats')
+def get_analytics_cache_stats():
+    """Hit rate and size of the /analytics result cache"""
+    return analytics_cache.stats()
+
+
 # ============ BONUS: GET /data/export - Export CSV ============
 @app.get('/data/export')
 def export_data(
     farm_id: int = None,
     sensor_id: str = None,
-    limit: int = 10000,
-    db: Session = Depends(get_db)
+    start_date: datetime = None,
+    end_date: datetime = None,
+    temp_min: float = None,
+    temp_max: float = None,
+    limit: int = None,
+    format: str = 'csv',
+    columns: str = None
 ):
     """
-    Export filtered data as CSV
+    Stream filtered data as CSV, NDJSON, Arrow IPC stream or Parquet
+    
+    Rows are read from a server-side cursor and written out chunk by chunk,
+    so the export size is not bounded by memory. limit=None exports every
+    matching row; columns is an optional comma-separated projection
+    (e.g. columns=ts,temperature).
     """
-    try:
-        readings = crud.get_readings_filtered(
-            db,
-            farm_id=farm_id,
-            sensor_id=sensor_id,
-            limit=limit
-        )
-        
-        # Convert to list of dicts
-        data = [
-            {
-                'id': r.id,
-                'sensor_id': r.sensor_id,
-                'farm_id': r.farm_id,
-                'ts': r.ts,
-                'temperature': r.temperature,
-                'humidity': r.humidity,
-                'ph': r.ph,
-                'rainfall': r.rainfall,
-                'n': r.n,
-                'p': r.p,
-                'k': r.k
-            }
-            for r in readings
-        ]
-        
-        # Try to import pandas, if not available return JSON
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}', expected one of {sorted(export.EXPORT_FORMATS)}")
+    if format in export.ARROW_FORMATS:
         try:
-            import pandas as pd
-            df = pd.DataFrame(data)
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            
-            return StreamingResponse(
-                iter([csv_buffer.getvalue()]),
-                media_type='text/csv',
-                headers={'Content-Disposition': 'attachment; filename=data_export.csv'}
-            )
+            import pyarrow
         except ImportError:
-            return {'data': data, 'note': 'CSV export requires pandas. Returning JSON instead.'}
-    except Exception as e:
-        logger.error(f'Failed to export data: {e}')
-        raise HTTPException(status_code=500, detail=f'Failed to export data: {str(e)}')
+            raise HTTPException(status_code=400, detail=f'{format} export requires pyarrow')
+    
+    selected = [c.strip() for c in columns.split(',') if c.strip()] if columns else crud.READING_COLUMNS
+    unknown = [c for c in selected if c not in crud.READING_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns {unknown}, expected any of {crud.READING_COLUMNS}")
+    
+    media_type, extension = export.EXPORT_FORMATS[format]
+    writer = export.WRITERS[format]
+    filters = dict(
+        farm_id=farm_id,
+        sensor_id=sensor_id,
+        start_date=start_date,
+        end_date=end_date,
+        temp_min=temp_min,
+        temp_max=temp_max,
+        limit=limit
+    )
+    
+    def generate():
+        # own session: the stream outlives the request handler
+        db = SessionLocal()
+        try:
+            chunks = crud.iter_readings_filtered(db, columns=selected, **filters)
+            yield from writer(chunks, selected)
+        except Exception as e:
+            logger.error(f'Failed to export data: {e}')
+            raise
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename=data_export.{extension}'}
+    )
 
 
 # ============ BONUS: DELETE /data/truncate - Clear All Data ============
@@ -443,6 +670,8 @@ def truncate_all_data(confirm: bool = False, db: Session = Depends(get_db)):
     
     try:
         success = crud.truncate_readings(db)
+        stats_snapshot.invalidate()
+        analytics_cache.invalidate()
         if success:
             logger.info('All readings truncated')
             return {'message': 'All data cleared successfully'}
@@ -452,3 +681,41 @@ def truncate_all_data(confirm: bool = False, db: Session = Depends(get_db)):
         logger.error(f'Failed to truncate data: {e}')
         raise HTTPException(status_code=500, detail=f'Failed to truncate: {str(e)}')
 
+
+@app.get('/admin/index-advisor')
+def index_advisor_report(min_scanned_rows: int = index_advisor.DEFAULT_MIN_SCANNED_ROWS, db: Session = Depends(get_db)):
+    """
+    EXPLAIN ANALYZE the hot readings queries and flag sequential scans
+    """
+    try:
+        report = index_advisor.check_queries(db, min_scanned_rows=min_scanned_rows)
+    except Exception as e:
+        logger.error(f'Index advisor failed: {e}')
+        raise HTTPException(status_code=500, detail=f'Index advisor failed: {str(e)}')
+    return {'regressed': any(entry['regressed'] for entry in report), 'queries': report}
+
+
+@app.get('/admin/storage')
+def storage_report(db: Session = Depends(get_db)):
+    """
+    Size of each readings chunk before and after compression, rollup sizes and policy jobs
+    """
+    try:
+        return storage.storage_report(db)
+    except Exception as e:
+        logger.error(f'Storage report failed: {e}')
+        raise HTTPException(status_code=500, detail=f'Storage report failed: {str(e)}')
+
+
+# ============ Opt-in async mode ============
+if settings.api_async_mode:
+    from app.async_api import router as async_router
+    
+    # serve the async handlers in place of their sync counterparts
+    replaced = {(route.path, method) for route in async_router.routes for method in route.methods}
+    app.router.routes = [
+        route for route in app.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, method) in replaced for method in route.methods))
+    ]
+    app.include_router(async_router)
+    logger.info(f'Async API mode enabled for {sorted(path for path, _ in replaced)}')
@@ -0,0 +1,329 @@
+"""
+Versioned schema migrations for the API database.
+
+Schema changes live in ``app/migrations`` as ``NNNN_description.sql`` files
+and are applied in version order, each in its own transaction, by one run
+per deploy (the compose ``migrate`` service or ``make migrate``). API workers
+never run DDL: at start-up they only compare the applied versions with the
+files shipped in the image (see app.lifecycle), so starting many workers
+does not queue them behind ACCESS EXCLUSIVE locks on the hypertable.
+
+Statements that Postgres refuses to run inside a transaction block
+(continuous aggregates, ``CALL refresh_continuous_aggregate``) go into a
+file whose first line is ``-- migrate:no-transaction``. Its statements run
+one by one in autocommit mode and must be idempotent, since a failure
+part-way leaves the earlier ones applied and the file is re-run in full.
+
+Applied versions are recorded in ``schema_migrations`` together with a
+checksum of the file. Concurrent runs serialize on a session-level advisory
+lock; the second run finds nothing left to do. Because that lock is held by
+the session, MIGRATE_DATABASE_URL should point at Postgres directly, not at
+PgBouncer in transaction pooling mode.
+
+    python -m app.migrate             # apply pending migrations and storage policies
+    python -m app.migrate status      # list applied and pending migrations
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from sqlalchemy import create_engine, exc, inspect, text
+from sqlalchemy.pool import NullPool
+from app import storage
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATIONS_TABLE = 'schema_migrations'
+# pg_advisory_lock key shared by every migrate run against the database
+MIGRATION_LOCK_ID = 7_263_001
+
+_FILE_RE = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+NO_TRANSACTION_MARKER = '-- migrate:no-transaction'
+
+CREATE_TABLE_SQL = f'''
+CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+    version TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    duration_ms DOUBLE PRECISION
+)
+'''
+
+Migration = namedtuple('Migration', ['version', 'name', 'path', 'sql', 'checksum', 'transactional'])
+
+
+class MigrationError(Exception):
+    """A migration failed or the migrations directory is inconsistent"""
+
+
+def discover(directory: str = MIGRATIONS_DIR):
+    """
+    Load the migration files of a directory
+
+    Returns:
+        List of Migration ordered by version
+
+    Raises:
+        MigrationError: On a file name that is not NNNN_name.sql or a duplicate version
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.sql'):
+            continue
+        match = _FILE_RE.match(filename)
+        if match is None:
+            raise MigrationError(f'Migration file {filename} does not match NNNN_name.sql')
+        version, name = match.groups()
+        if version in migrations:
+            raise MigrationError(f'Duplicate migration version {version}: {migrations[version].name}, {name}')
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        transactional = not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+        migrations[version] = Migration(version, name, os.path.join(directory, filename), sql, checksum, transactional)
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def split_statements(sql: str):
+    """
+    Split a SQL script into statements on top-level semicolons
+
+    Semicolons inside quoted strings, quoted identifiers, dollar-quoted
+    bodies and comments do not end a statement.
+    """
+    statements = []
+    current = []
+    i = 0
+    n = len(sql)
+    while i < n:
+        c = sql[i]
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = n if end < 0 else end + 1
+            continue
+        if sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        if c in ("'", '"'):
+            end = i + 1
+            while end < n:
+                if sql[end] == c:
+                    if end + 1 < n and sql[end + 1] == c:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if c == '$':
+            match = re.match(r'\$[A-Za-z_]*\$', sql[i:])
+            if match:
+                tag = match.group(0)
+                end = sql.find(tag, i + len(tag))
+                end = n if end < 0 else end + len(tag)
+                current.append(sql[i:end])
+                i = end
+                continue
+        if c == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(c)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def applied_versions(conn):
+    """
+    Versions recorded in schema_migrations
+
+    Args:
+        conn: SQLAlchemy connection
+
+    Returns:
+        Dict of version -> checksum (empty when nothing was ever migrated)
+    """
+    if not inspect(conn).has_table(MIGRATIONS_TABLE):
+        return {}
+    rows = conn.execute(text(f'SELECT version, checksum FROM {MIGRATIONS_TABLE}')).all()
+    return {version: checksum for version, checksum in rows}
+
+
+def pending_versions(conn, migrations=None):
+    """Versions shipped in app/migrations that are not applied yet"""
+    migrations = discover() if migrations is None else migrations
+    applied = applied_versions(conn)
+    return [m.version for m in migrations if m.version not in applied]
+
+
+def _engine(database_url: str = None):
+    return create_engine(database_url or settings.migrate_database_url or settings.database_url, poolclass=NullPool)
+
+
+def _connect(engine, timeout: float):
+    """Connect, retrying while the database is still starting up"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return engine.connect()
+        except exc.OperationalError as e:
+            if time.monotonic() >= deadline:
+                raise
+            logger.info(f'Database not reachable yet ({e.orig}); retrying')
+            time.sleep(1)
+
+
+def _check_checksums(migrations, applied):
+    for m in migrations:
+        if m.version in applied and applied[m.version] != m.checksum:
+            logger.warning(f'Migration {m.version}_{m.name} changed after it was applied; '
+                           f'edits to applied migrations are not re-run, add a new migration instead')
+
+
+def _run_autocommit(engine, migration):
+    """Run the statements of a no-transaction migration one at a time"""
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for statement in split_statements(migration.sql):
+            conn.exec_driver_sql(statement, execution_options={'no_parameters': True})
+
+
+def upgrade(database_url: str = None, directory: str = MIGRATIONS_DIR, connect_timeout: float = None,
+            apply_policies: bool = True):
+    """
+    Apply all pending migrations, then the readings storage policies
+
+    Args:
+        database_url: Database to migrate (default MIGRATE_DATABASE_URL, then DATABASE_URL)
+        directory: Directory holding the migration files
+        connect_timeout: Seconds to keep retrying the initial connection
+        apply_policies: Also sync chunk interval, compression and retention
+            with settings (see app.storage)
+
+    Returns:
+        List of versions applied by this run
+
+    Raises:
+        MigrationError: If a migration fails (it is rolled back, later ones are
+            not run) or the storage policies cannot be applied
+    """
+    migrations = discover(directory)
+    timeout = settings.migrate_connect_timeout if connect_timeout is None else connect_timeout
+    engine = _engine(database_url)
+    done = []
+    try:
+        with _connect(engine, timeout) as conn:
+            # session-level lock: held across the per-migration transactions below
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_ID})
+            conn.commit()
+            try:
+                conn.execute(text(CREATE_TABLE_SQL))
+                conn.commit()
+                applied = applied_versions(conn)
+                conn.commit()
+                _check_checksums(migrations, applied)
+                for m in migrations:
+                    if m.version in applied:
+                        continue
+                    start = time.perf_counter()
+                    try:
+                        if m.transactional:
+                            # no_parameters: run the file as-is (several statements, literal % signs)
+                            conn.exec_driver_sql(m.sql, execution_options={'no_parameters': True})
+                        else:
+                            _run_autocommit(engine, m)
+                        duration_ms = (time.perf_counter() - start) * 1000
+                        conn.execute(
+                            text(f'INSERT INTO {MIGRATIONS_TABLE} (version, name, checksum, duration_ms) '
+                                 f'VALUES (:version, :name, :checksum, :duration_ms)'),
+                            {'version': m.version, 'name': m.name, 'checksum': m.checksum, 'duration_ms': duration_ms}
+                        )
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        raise MigrationError(f'Migration {m.version}_{m.name} failed: {e}') from e
+                    logger.info(f'Applied migration {m.version}_{m.name} in {duration_ms:.0f}ms')
+                    done.append(m.version)
+                if apply_policies:
+                    try:
+                        storage.apply_policies(conn)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        raise MigrationError(f'Applying storage policies failed: {e}') from e
+            finally:
+                conn.rollback()
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_ID})
+                conn.commit()
+    finally:
+        engine.dispose()
+    if not done:
+        logger.info('Schema is up to date')
+    return done
+
+
+def status(database_url: str = None, directory: str = MIGRATIONS_DIR):
+    """
+    Applied and pending migrations
+
+    Returns:
+        List of dicts with version, name, applied (bool) and checksum_changed
+    """
+    migrations = discover(directory)
+    engine = _engine(database_url)
+    try:
+        with engine.connect() as conn:
+            applied = applied_versions(conn)
+    finally:
+        engine.dispose()
+    return [
+        {
+            'version': m.version,
+            'name': m.name,
+            'applied': m.version in applied,
+            'checksum_changed': m.version in applied and applied[m.version] != m.checksum
+        }
+        for m in migrations
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations')
+    parser.add_argument('command', nargs='?', choices=['upgrade', 'status'], default='upgrade')
+    parser.add_argument('--database-url', default=None, help='default: MIGRATE_DATABASE_URL, then DATABASE_URL')
+    parser.add_argument('--skip-policies', action='store_true',
+                        help='do not sync chunk interval, compression and retention with settings')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.command == 'status':
+        for row in status(args.database_url):
+            state = 'applied' if row['applied'] else 'pending'
+            if row['checksum_changed']:
+                state += ' (file changed since)'
+            print(f"{row['version']}  {row['name']:<40} {state}")
+        return 0
+
+    try:
+        upgrade(args.database_url, apply_policies=not args.skip_policies)
+    except MigrationError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+-- Baseline schema: farms, sensors, models and the readings hypertable.
+-- Every statement is idempotent so databases created by the former
+-- db/schema.sql init script (or by the API's old start-up DDL) upgrade cleanly.
+
+CREATE EXTENSION IF NOT EXISTS timescaledb;
+
+CREATE TABLE IF NOT EXISTS farms (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT
+);
+
+-- sample farms, only seeded into an empty table
+INSERT INTO farms (name, location)
+SELECT name, location FROM (VALUES
+    ('Farm North', 'North Region'),
+    ('Farm South', 'South Region'),
+    ('Farm East', 'East Region'),
+    ('Farm West', 'West Region'),
+    ('Demo Farm', 'Lab')
+) AS seed (name, location)
+WHERE NOT EXISTS (SELECT 1 FROM farms);
+
+CREATE TABLE IF NOT EXISTS sensors (
+    id SERIAL PRIMARY KEY,
+    sensor_id TEXT UNIQUE NOT NULL,
+    farm_id INTEGER REFERENCES farms(id)
+);
+
+CREATE TABLE IF NOT EXISTS models (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    version TEXT,
+    accuracy DOUBLE PRECISION,
+    model_metadata JSONB,
+    active BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- columns missing from models tables created by the old init script
+ALTER TABLE models ADD COLUMN IF NOT EXISTS version TEXT;
+ALTER TABLE models ADD COLUMN IF NOT EXISTS accuracy DOUBLE PRECISION;
+ALTER TABLE models ADD COLUMN IF NOT EXISTS model_metadata JSONB;
+ALTER TABLE models ADD COLUMN IF NOT EXISTS active BOOLEAN DEFAULT FALSE;
+ALTER TABLE models ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE DEFAULT now();
+
+CREATE TABLE IF NOT EXISTS readings (
+    id BIGSERIAL,
+    ts TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    sensor_id TEXT,
+    temperature DOUBLE PRECISION,
+    humidity DOUBLE PRECISION,
+    ph DOUBLE PRECISION,
+    rainfall DOUBLE PRECISION,
+    n INTEGER,
+    p INTEGER,
+    k INTEGER,
+    farm_id INTEGER,
+    PRIMARY KEY (ts, id),
+    CONSTRAINT fk_farm FOREIGN KEY(farm_id) REFERENCES farms(id) ON DELETE SET NULL
+);
+
+SELECT create_hypertable('readings', 'ts', if_not_exists => TRUE);
@@ -0,0 +1,2 @@
+-- Crop actually grown (ground truth for training), usually unset.
+ALTER TABLE readings ADD COLUMN IF NOT EXISTS label TEXT;
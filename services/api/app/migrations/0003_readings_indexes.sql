@@ -0,0 +1,10 @@
+-- Hot-path indexes for the crud queries checked by app/index_advisor.py.
+
+-- latest reading per farm (/predict by farm_id) and farm-filtered ranges
+CREATE INDEX IF NOT EXISTS readings_farm_ts_idx ON readings (farm_id, ts DESC);
+-- sensor-filtered ranges (/data/filtered, /data/export)
+CREATE INDEX IF NOT EXISTS readings_sensor_ts_idx ON readings (sensor_id, ts DESC);
+-- temperature range filters without a farm/sensor filter
+CREATE INDEX IF NOT EXISTS readings_temperature_idx ON readings (temperature, ts DESC) WHERE temperature IS NOT NULL;
+-- incremental training snapshots (ml/readings_source.py: labelled rows with id > watermark)
+CREATE INDEX IF NOT EXISTS readings_labelled_id_idx ON readings (id) WHERE label IS NOT NULL;
@@ -0,0 +1,42 @@
+-- Last known state per farm / sensor, upserted by every ingest path
+-- (see app/latest.py), filled once from the existing readings.
+
+CREATE TABLE IF NOT EXISTS farm_latest (
+    farm_id INTEGER PRIMARY KEY,
+    ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    sensor_id TEXT,
+    temperature DOUBLE PRECISION,
+    humidity DOUBLE PRECISION,
+    ph DOUBLE PRECISION,
+    rainfall DOUBLE PRECISION,
+    n INTEGER,
+    p INTEGER,
+    k INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS sensor_latest (
+    sensor_id TEXT PRIMARY KEY,
+    ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    farm_id INTEGER,
+    temperature DOUBLE PRECISION,
+    humidity DOUBLE PRECISION,
+    ph DOUBLE PRECISION,
+    rainfall DOUBLE PRECISION,
+    n INTEGER,
+    p INTEGER,
+    k INTEGER
+);
+
+INSERT INTO farm_latest (farm_id, ts, sensor_id, temperature, humidity, ph, rainfall, n, p, k)
+SELECT DISTINCT ON (farm_id) farm_id, ts, sensor_id, temperature, humidity, ph, rainfall, n, p, k
+FROM readings
+WHERE farm_id IS NOT NULL
+ORDER BY farm_id, ts DESC, id DESC
+ON CONFLICT (farm_id) DO NOTHING;
+
+INSERT INTO sensor_latest (sensor_id, ts, farm_id, temperature, humidity, ph, rainfall, n, p, k)
+SELECT DISTINCT ON (sensor_id) sensor_id, ts, farm_id, temperature, humidity, ph, rainfall, n, p, k
+FROM readings
+WHERE sensor_id IS NOT NULL
+ORDER BY sensor_id, ts DESC, id DESC
+ON CONFLICT (sensor_id) DO NOTHING;
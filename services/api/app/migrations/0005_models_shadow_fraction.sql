@@ -0,0 +1,2 @@
+-- Share of live /predict traffic a candidate model scores in shadow mode (see app/shadow.py).
+ALTER TABLE models ADD COLUMN IF NOT EXISTS shadow_fraction DOUBLE PRECISION DEFAULT 0;
@@ -0,0 +1,10 @@
+-- Native compression of readings chunks older than a week.
+-- Segmenting by farm keeps farm-filtered scans of old chunks cheap; the
+-- (ts, id) ordering matches the primary key.
+ALTER TABLE readings SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'farm_id',
+    timescaledb.compress_orderby = 'ts DESC, id DESC'
+);
+
+SELECT add_compression_policy('readings', INTERVAL '7 days', if_not_exists => TRUE);
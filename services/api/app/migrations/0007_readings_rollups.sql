@@ -0,0 +1,89 @@
+-- migrate:no-transaction
+-- Continuous aggregates of readings per farm and sensor at 1 minute, 1 hour
+-- and 1 day (served by GET /data/rollup, see app/rollup.py).
+--
+-- Each bucket keeps sum/count/min/max per feature instead of an average so
+-- buckets can be combined exactly: readings_1h is built on readings_1m and
+-- readings_1d on readings_1h, and the API averages across sensors and wider
+-- buckets as sum(x_sum) / sum(x_count). Views answer in real time (the part
+-- not yet materialized is aggregated from the raw rows on read).
+--
+-- Refresh windows stay inside the 7 day compression horizon of
+-- 0006_readings_compression.sql; a refresh only recomputes buckets that were
+-- invalidated by writes, so the wide windows are cheap.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS readings_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '1 minute', ts) AS bucket,
+    farm_id,
+    sensor_id,
+    count(*) AS readings,
+    sum(temperature) AS temperature_sum, count(temperature) AS temperature_count, min(temperature) AS temperature_min, max(temperature) AS temperature_max,
+    sum(humidity) AS humidity_sum, count(humidity) AS humidity_count, min(humidity) AS humidity_min, max(humidity) AS humidity_max,
+    sum(ph) AS ph_sum, count(ph) AS ph_count, min(ph) AS ph_min, max(ph) AS ph_max,
+    sum(rainfall) AS rainfall_sum, count(rainfall) AS rainfall_count, min(rainfall) AS rainfall_min, max(rainfall) AS rainfall_max,
+    sum(n) AS n_sum, count(n) AS n_count, min(n) AS n_min, max(n) AS n_max,
+    sum(p) AS p_sum, count(p) AS p_count, min(p) AS p_min, max(p) AS p_max,
+    sum(k) AS k_sum, count(k) AS k_count, min(k) AS k_min, max(k) AS k_max
+FROM readings
+GROUP BY time_bucket(INTERVAL '1 minute', ts), farm_id, sensor_id
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS readings_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '1 hour', bucket) AS bucket,
+    farm_id,
+    sensor_id,
+    sum(readings) AS readings,
+    sum(temperature_sum) AS temperature_sum, sum(temperature_count) AS temperature_count, min(temperature_min) AS temperature_min, max(temperature_max) AS temperature_max,
+    sum(humidity_sum) AS humidity_sum, sum(humidity_count) AS humidity_count, min(humidity_min) AS humidity_min, max(humidity_max) AS humidity_max,
+    sum(ph_sum) AS ph_sum, sum(ph_count) AS ph_count, min(ph_min) AS ph_min, max(ph_max) AS ph_max,
+    sum(rainfall_sum) AS rainfall_sum, sum(rainfall_count) AS rainfall_count, min(rainfall_min) AS rainfall_min, max(rainfall_max) AS rainfall_max,
+    sum(n_sum) AS n_sum, sum(n_count) AS n_count, min(n_min) AS n_min, max(n_max) AS n_max,
+    sum(p_sum) AS p_sum, sum(p_count) AS p_count, min(p_min) AS p_min, max(p_max) AS p_max,
+    sum(k_sum) AS k_sum, sum(k_count) AS k_count, min(k_min) AS k_min, max(k_max) AS k_max
+FROM readings_1m
+GROUP BY time_bucket(INTERVAL '1 hour', bucket), farm_id, sensor_id
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS readings_1d
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '1 day', bucket) AS bucket,
+    farm_id,
+    sensor_id,
+    sum(readings) AS readings,
+    sum(temperature_sum) AS temperature_sum, sum(temperature_count) AS temperature_count, min(temperature_min) AS temperature_min, max(temperature_max) AS temperature_max,
+    sum(humidity_sum) AS humidity_sum, sum(humidity_count) AS humidity_count, min(humidity_min) AS humidity_min, max(humidity_max) AS humidity_max,
+    sum(ph_sum) AS ph_sum, sum(ph_count) AS ph_count, min(ph_min) AS ph_min, max(ph_max) AS ph_max,
+    sum(rainfall_sum) AS rainfall_sum, sum(rainfall_count) AS rainfall_count, min(rainfall_min) AS rainfall_min, max(rainfall_max) AS rainfall_max,
+    sum(n_sum) AS n_sum, sum(n_count) AS n_count, min(n_min) AS n_min, max(n_max) AS n_max,
+    sum(p_sum) AS p_sum, sum(p_count) AS p_count, min(p_min) AS p_min, max(p_max) AS p_max,
+    sum(k_sum) AS k_sum, sum(k_count) AS k_count, min(k_min) AS k_min, max(k_max) AS k_max
+FROM readings_1h
+GROUP BY time_bucket(INTERVAL '1 day', bucket), farm_id, sensor_id
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS readings_1m_farm_bucket_idx ON readings_1m (farm_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS readings_1h_farm_bucket_idx ON readings_1h (farm_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS readings_1d_farm_bucket_idx ON readings_1d (farm_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS readings_1m_sensor_bucket_idx ON readings_1m (sensor_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS readings_1h_sensor_bucket_idx ON readings_1h (sensor_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS readings_1d_sensor_bucket_idx ON readings_1d (sensor_id, bucket DESC);
+
+SELECT add_continuous_aggregate_policy('readings_1m',
+    start_offset => INTERVAL '6 days', end_offset => INTERVAL '1 minute',
+    schedule_interval => INTERVAL '1 minute', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('readings_1h',
+    start_offset => INTERVAL '6 days', end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '15 minutes', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('readings_1d',
+    start_offset => INTERVAL '6 days', end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour', if_not_exists => TRUE);
+
+-- materialize existing history once, finest level first
+CALL refresh_continuous_aggregate('readings_1m', NULL, NULL);
+CALL refresh_continuous_aggregate('readings_1h', NULL, NULL);
+CALL refresh_continuous_aggregate('readings_1d', NULL, NULL);
@@ -0,0 +1,59 @@
+-- migrate:no-transaction
+-- Segment compressed readings by farm and sensor (queries filter on both)
+-- instead of farm only. id stays in the ordering because the (ts, id)
+-- primary key requires it.
+--
+-- Compression settings cannot change while any chunk is compressed, so
+-- chunks compressed under 0006 are decompressed first and compressed again
+-- with the new settings afterwards. Operational cost on a populated
+-- database:
+--   * disk: at the peak every previously compressed chunk is stored
+--     uncompressed at the same time; check free space against the
+--     uncompressed_bytes total of GET /admin/storage before migrating
+--   * locks: each chunk is decompressed / compressed and committed on its
+--     own, so a chunk is only locked while it is being rewritten; there is
+--     no transaction spanning the whole table
+--   * time: proportional to the compressed data; run it off-peak
+-- Every step is idempotent, so an interrupted run can simply be repeated.
+
+DO $$
+DECLARE
+    chunk regclass;
+BEGIN
+    FOR chunk IN
+        SELECT format('%I.%I', chunk_schema, chunk_name)::regclass
+        FROM timescaledb_information.chunks
+        WHERE hypertable_name = 'readings' AND is_compressed
+        ORDER BY range_start
+    LOOP
+        PERFORM decompress_chunk(chunk, if_compressed => TRUE);
+        COMMIT;
+    END LOOP;
+END
+$$;
+
+ALTER TABLE readings SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'farm_id, sensor_id',
+    timescaledb.compress_orderby = 'ts DESC, id DESC'
+);
+
+-- recompress what the compression policy covers (see app/storage.py) now
+-- rather than on its next run, again one chunk per transaction
+DO $$
+DECLARE
+    horizon interval;
+    chunk regclass;
+BEGIN
+    SELECT (config->>'compress_after')::interval INTO horizon
+    FROM timescaledb_information.jobs
+    WHERE proc_name = 'policy_compression' AND hypertable_name = 'readings';
+    IF horizon IS NULL THEN
+        RETURN;
+    END IF;
+    FOR chunk IN SELECT show_chunks('readings', older_than => horizon) LOOP
+        PERFORM compress_chunk(chunk, if_not_compressed => TRUE);
+        COMMIT;
+    END LOOP;
+END
+$$;
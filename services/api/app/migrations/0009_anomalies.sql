@@ -0,0 +1,48 @@
+-- Rolling per-sensor statistics and detected anomalies (see app/anomaly.py).
+-- sensor_stats holds the EWMA mean/variance of every feature and is updated
+-- in the ingest transaction; anomalies records readings whose z-score
+-- against those statistics crossed the threshold.
+
+CREATE TABLE IF NOT EXISTS sensor_stats (
+    sensor_id TEXT PRIMARY KEY,
+    farm_id INTEGER,
+    ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    temperature_count BIGINT NOT NULL DEFAULT 0,
+    temperature_mean DOUBLE PRECISION,
+    temperature_var DOUBLE PRECISION,
+    humidity_count BIGINT NOT NULL DEFAULT 0,
+    humidity_mean DOUBLE PRECISION,
+    humidity_var DOUBLE PRECISION,
+    ph_count BIGINT NOT NULL DEFAULT 0,
+    ph_mean DOUBLE PRECISION,
+    ph_var DOUBLE PRECISION,
+    rainfall_count BIGINT NOT NULL DEFAULT 0,
+    rainfall_mean DOUBLE PRECISION,
+    rainfall_var DOUBLE PRECISION,
+    n_count BIGINT NOT NULL DEFAULT 0,
+    n_mean DOUBLE PRECISION,
+    n_var DOUBLE PRECISION,
+    p_count BIGINT NOT NULL DEFAULT 0,
+    p_mean DOUBLE PRECISION,
+    p_var DOUBLE PRECISION,
+    k_count BIGINT NOT NULL DEFAULT 0,
+    k_mean DOUBLE PRECISION,
+    k_var DOUBLE PRECISION
+);
+
+CREATE TABLE IF NOT EXISTS anomalies (
+    id BIGSERIAL PRIMARY KEY,
+    ts TIMESTAMP WITH TIME ZONE NOT NULL,
+    detected_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    sensor_id TEXT NOT NULL,
+    farm_id INTEGER,
+    field TEXT NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    mean DOUBLE PRECISION NOT NULL,
+    std DOUBLE PRECISION NOT NULL,
+    zscore DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS anomalies_ts_idx ON anomalies (ts DESC);
+CREATE INDEX IF NOT EXISTS anomalies_sensor_ts_idx ON anomalies (sensor_id, ts DESC);
+CREATE INDEX IF NOT EXISTS anomalies_farm_ts_idx ON anomalies (farm_id, ts DESC);
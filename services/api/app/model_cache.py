@@ -0,0 +1,271 @@
+"""
+Process-wide cache for the active crop model.
+
+The cache keys each loaded model on the registry record (id, path) plus the
+mtimes of the joblib file and of its compiled export, so a worker that loaded
+the joblib model while the export was still being written switches to the
+compiled forest once the export lands. The active record is only re-resolved every
+``MODEL_CACHE_CHECK_SECONDS``, so a steady stream of predictions is served
+from memory without touching the models table or the disk.
+"""
+import os
+import threading
+import time
+import logging
+import joblib
+from app import crud, forest
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CachedModel:
+    """A loaded model together with the key it was loaded under"""
+
+    def __init__(self, model, record_id, path, mtime, export_mtime):
+        self.model = model
+        self.record_id = record_id
+        self.path = path
+        self.mtime = mtime
+        self.export_mtime = export_mtime
+        self.loaded_at = time.time()
+
+    @property
+    def key(self):
+        return (self.record_id, self.path, self.mtime, self.export_mtime)
+
+
+def _artifact_key(record_id, path):
+    """Return the cache key for a model file, or None if it does not exist"""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    return (record_id, path, mtime, forest.export_mtime(forest.forest_dir(path)))
+
+
+class ModelCache:
+    """
+    Holds the active model in memory and swaps it atomically on reload.
+
+    Requests only take the reload lock when the check interval has expired.
+    While one request reloads, the others keep serving the previous model.
+    """
+
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._current = None
+        self._checked_at = 0.0
+        self._failed_keys = set()
+        # models of other records (shadow candidates), keyed by record id
+        self._records = {}
+        self._records_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.invalidations = 0
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _is_fresh(self, current):
+        return current is not None and time.monotonic() - self._checked_at < self.check_interval
+
+    def lookup(self):
+        """Return the cached model if it is still fresh, else None"""
+        current = self._current
+        if self._is_fresh(current):
+            self._count('hits')
+            return current.model
+        return None
+
+    def get(self, db):
+        """
+        Return the active model, loading it only when the record or file changed
+
+        Args:
+            db: Database session used to resolve the active model record
+
+        Returns:
+            The loaded model, or None if neither the registered nor the
+            configured model path can be loaded
+        """
+        model = self.lookup()
+        if model is not None:
+            return model
+        return self._refresh(lambda: crud.get_active_model(db))
+
+    def refresh(self, record):
+        """
+        Reload for an active model record the caller already resolved
+
+        Used by the async API, which looks the record up on its own session.
+        """
+        return self._refresh(lambda: record)
+
+    def _refresh(self, resolve_record):
+        current = self._current
+        if not self._reload_lock.acquire(blocking=current is None):
+            # another request is already reloading; keep serving the old model
+            self._count('hits')
+            return current.model
+        try:
+            current = self._current
+            if self._is_fresh(current):
+                self._count('hits')
+                return current.model
+            return self._reload(resolve_record())
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self, record):
+        candidates = []
+        if record is not None and record.path:
+            candidates.append((record.id, record.path))
+        candidates.append((None, settings.model_path))
+
+        for record_id, path in candidates:
+            key = _artifact_key(record_id, path)
+            if key is None or key in self._failed_keys:
+                continue
+            if self._current is not None and self._current.key == key:
+                self._checked_at = time.monotonic()
+                self._count('hits')
+                return self._current.model
+            cached = self._load(*key)
+            if cached is None:
+                # do not retry a broken artifact until it is replaced on disk
+                self._failed_keys.add(key)
+                continue
+            self._current = cached
+            self._checked_at = time.monotonic()
+            return cached.model
+
+        self._current = None
+        self._checked_at = time.monotonic()
+        return None
+
+    def _load(self, record_id, path, mtime, export_mtime):
+        self._count('misses')
+        try:
+            compiled_dir = forest.forest_dir(path)
+            # an export older than the model file belongs to a previous model
+            if settings.model_prefer_compiled and export_mtime is not None and export_mtime >= mtime:
+                model = forest.CompiledForest.load(compiled_dir, mmap=settings.model_mmap)
+                path_loaded = compiled_dir
+            else:
+                model = joblib.load(path, mmap_mode='r' if settings.model_mmap else None)
+                path_loaded = path
+        except Exception as e:
+            self._count('load_failures')
+            logger.warning(f'Failed to load model from {path}: {e}')
+            return None
+        self._count('loads')
+        logger.info(f'Loaded model {record_id} from {path_loaded}')
+        return CachedModel(model, record_id, path, mtime, export_mtime)
+
+    def get_record_model(self, record):
+        """
+        Load (or reuse) the model of an arbitrary registry record
+
+        Used for shadow candidates, which are not the active model. Each
+        record keeps its own cache entry, keyed like the active model on
+        (id, path, mtime, export mtime).
+
+        Returns:
+            The loaded model, or None if its artifact cannot be loaded
+        """
+        key = _artifact_key(record.id, record.path) if record.path else None
+        if key is None:
+            return None
+        current = self._current
+        if current is not None and current.key == key:
+            return current.model
+        with self._records_lock:
+            cached = self._records.get(record.id)
+            if cached is not None and cached.key == key:
+                return cached.model
+            if key in self._failed_keys:
+                return None
+        cached = self._load(*key)
+        with self._records_lock:
+            if cached is None:
+                self._failed_keys.add(key)
+                self._records.pop(record.id, None)
+                return None
+            self._records[record.id] = cached
+        return cached.model
+
+    def retain_records(self, record_ids):
+        """Drop cached record models whose id is not in record_ids"""
+        with self._records_lock:
+            for record_id in set(self._records) - set(record_ids):
+                del self._records[record_id]
+
+    def token(self, model):
+        """
+        Stable identity (record id, path, mtimes) of a model this cache returned
+
+        Returns None if the model has been swapped out in the meantime, so
+        callers never attribute results to the wrong model.
+        """
+        current = self._current
+        if current is not None and current.model is model:
+            return current.key
+        return None
+
+    def activate(self, record):
+        """
+        Load a newly activated model record and swap it in
+
+        The previous model keeps serving until the new one is fully loaded.
+        If the new artifact cannot be loaded the cache is invalidated so the
+        next request re-resolves the active model.
+        """
+        key = _artifact_key(record.id, record.path) if record.path else None
+        cached = self._load(*key) if key is not None else None
+        with self._reload_lock:
+            if cached is None:
+                self._checked_at = 0.0
+                return False
+            self._current = cached
+            self._checked_at = time.monotonic()
+        return True
+
+    def invalidate(self):
+        """Drop the cached model so the next request reloads it"""
+        with self._reload_lock:
+            self._current = None
+            self._checked_at = 0.0
+            self._failed_keys.clear()
+        with self._records_lock:
+            self._records.clear()
+        self._count('invalidations')
+
+    def stats(self):
+        current = self._current
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'loads': self.loads,
+                'load_failures': self.load_failures,
+                'invalidations': self.invalidations,
+                'check_interval_seconds': self.check_interval,
+                'model': None if current is None else {
+                    'record_id': current.record_id,
+                    'path': current.path,
+                    'mtime': current.mtime,
+                    'compiled': isinstance(current.model, forest.CompiledForest),
+                    'loaded_at': current.loaded_at
+                }
+            }
+
+
+model_cache = ModelCache(check_interval=settings.model_cache_check_seconds)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, Text, TIMESTAMP, Float, Boolean
+from sqlalchemy import Column, Integer, BigInteger, Text, TIMESTAMP, Float, Boolean, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -15,6 +15,42 @@ class Reading(Base):
     p = Column(Integer)
     k = Column(Integer)
     farm_id = Column(Integer)
+    # crop actually grown (ground truth for training), usually unset
+    label = Column(Text)
+
+# hot-path indexes (created by app/migrations/0003_readings_indexes.sql)
+Index('readings_farm_ts_idx', Reading.farm_id, Reading.ts.desc())
+Index('readings_sensor_ts_idx', Reading.sensor_id, Reading.ts.desc())
+Index('readings_temperature_idx', Reading.temperature, Reading.ts.desc(), postgresql_where=Reading.temperature.isnot(None))
+Index('readings_labelled_id_idx', Reading.id, postgresql_where=Reading.label.isnot(None))
+
+class FarmLatest(Base):
+    """Most recent reading of each farm, maintained on ingest (see app.latest)"""
+    __tablename__ = 'farm_latest'
+    farm_id = Column(Integer, primary_key=True)
+    ts = Column(TIMESTAMP(timezone=True), nullable=False)
+    sensor_id = Column(Text)
+    temperature = Column(Float)
+    humidity = Column(Float)
+    ph = Column(Float)
+    rainfall = Column(Float)
+    n = Column(Integer)
+    p = Column(Integer)
+    k = Column(Integer)
+
+class SensorLatest(Base):
+    """Most recent reading of each sensor, maintained on ingest (see app.latest)"""
+    __tablename__ = 'sensor_latest'
+    sensor_id = Column(Text, primary_key=True)
+    ts = Column(TIMESTAMP(timezone=True), nullable=False)
+    farm_id = Column(Integer)
+    temperature = Column(Float)
+    humidity = Column(Float)
+    ph = Column(Float)
+    rainfall = Column(Float)
+    n = Column(Integer)
+    p = Column(Integer)
+    k = Column(Integer)
 
 class Farm(Base):
     __tablename__ = 'farms'
@@ -22,6 +58,52 @@ class Farm(Base):
     name = Column(Text)
     location = Column(Text)
 
+class SensorStats(Base):
+    """EWMA mean/variance of each feature per sensor, maintained on ingest (see app.anomaly)"""
+    __tablename__ = 'sensor_stats'
+    sensor_id = Column(Text, primary_key=True)
+    farm_id = Column(Integer)
+    ts = Column(TIMESTAMP(timezone=True), nullable=False)
+    temperature_count = Column(BigInteger, nullable=False, default=0)
+    temperature_mean = Column(Float)
+    temperature_var = Column(Float)
+    humidity_count = Column(BigInteger, nullable=False, default=0)
+    humidity_mean = Column(Float)
+    humidity_var = Column(Float)
+    ph_count = Column(BigInteger, nullable=False, default=0)
+    ph_mean = Column(Float)
+    ph_var = Column(Float)
+    rainfall_count = Column(BigInteger, nullable=False, default=0)
+    rainfall_mean = Column(Float)
+    rainfall_var = Column(Float)
+    n_count = Column(BigInteger, nullable=False, default=0)
+    n_mean = Column(Float)
+    n_var = Column(Float)
+    p_count = Column(BigInteger, nullable=False, default=0)
+    p_mean = Column(Float)
+    p_var = Column(Float)
+    k_count = Column(BigInteger, nullable=False, default=0)
+    k_mean = Column(Float)
+    k_var = Column(Float)
+
+class Anomaly(Base):
+    """A reading field whose z-score against its sensor's rolling statistics crossed the threshold"""
+    __tablename__ = 'anomalies'
+    id = Column(BigInteger, primary_key=True)
+    ts = Column(TIMESTAMP(timezone=True), nullable=False)
+    detected_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    sensor_id = Column(Text, nullable=False)
+    farm_id = Column(Integer)
+    field = Column(Text, nullable=False)
+    value = Column(Float, nullable=False)
+    mean = Column(Float, nullable=False)
+    std = Column(Float, nullable=False)
+    zscore = Column(Float, nullable=False)
+
+Index('anomalies_ts_idx', Anomaly.ts.desc())
+Index('anomalies_sensor_ts_idx', Anomaly.sensor_id, Anomaly.ts.desc())
+Index('anomalies_farm_ts_idx', Anomaly.farm_id, Anomaly.ts.desc())
+
 class ModelRecord(Base):
     __tablename__ = 'models'
     id = Column(Integer, primary_key=True)
@@ -31,4 +113,6 @@ class ModelRecord(Base):
     accuracy = Column(Float, nullable=True)
     model_metadata = Column(Text, nullable=True)
     active = Column(Boolean, server_default='false')
+    # fraction of /predict traffic also scored by this (inactive) model in shadow mode
+    shadow_fraction = Column(Float, server_default='0')
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
@@ -0,0 +1,163 @@
+"""
+Feature assembly and top-k scoring shared by /predict and /predict/batch.
+
+Rows are scored as one (N, 7) matrix with a single ``predict_proba`` call and
+the top-k classes are selected with ``np.argpartition`` instead of sorting
+every row's probabilities in Python.
+
+Single /predict calls are memoized in ``prediction_cache`` keyed on the
+loaded model, the feature vector rounded to PREDICTION_CACHE_DECIMALS and
+top_k. Cached requests are scored on the rounded features so a result does
+not depend on which request populated the entry.
+"""
+import numpy as np
+from app.cache import prediction_cache
+from app.config import settings
+
+# order features to match training: N,P,K,temp,humidity,ph,rainfall
+FEATURE_ORDER = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+# ReadingIn / Reading attribute for each entry of FEATURE_ORDER
+READING_FIELDS = ['n', 'p', 'k', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Demo mode: placeholder predictions returned when no model can be loaded
+DEMO_PREDICTIONS = [
+    {'crop': 'Rice', 'probability': 0.45},
+    {'crop': 'Maize', 'probability': 0.35},
+    {'crop': 'Wheat', 'probability': 0.20}
+]
+
+
+def reading_features(reading) -> dict:
+    """Feature dict for a stored reading; missing values become 0"""
+    return {name: getattr(reading, field) or 0 for name, field in zip(FEATURE_ORDER, READING_FIELDS)}
+
+
+def features_to_matrix(feats: dict) -> np.ndarray:
+    """
+    Build a one-row feature matrix from a {feature_name: value} dict
+
+    Raises:
+        ValueError: If a feature is not a finite number (names the feature)
+    """
+    row = []
+    for name in FEATURE_ORDER:
+        value = feats.get(name, 0)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Feature '{name}' must be a number, got {value!r}")
+        if not np.isfinite(number):
+            raise ValueError(f"Feature '{name}' must be finite, got {value!r}")
+        row.append(number)
+    return np.array([row], dtype=np.float64)
+
+
+def readings_to_matrix(readings) -> np.ndarray:
+    """Build an (N, 7) feature matrix from readings; missing values become 0"""
+    rows = [tuple(getattr(r, f) or 0 for f in READING_FIELDS) for r in readings]
+    if not rows:
+        return np.empty((0, len(READING_FIELDS)), dtype=np.float64)
+    return np.array(rows, dtype=np.float64)
+
+
+def top_k_predictions(model, X: np.ndarray, top_k: int = 5):
+    """
+    Score every row of X and return the top_k crops per row
+
+    Args:
+        model: Fitted classifier (predict_proba/classes_ or predict)
+        X: (N, 7) feature matrix in FEATURE_ORDER
+        top_k: Number of crops to return per row
+
+    Returns:
+        List with one [{'crop': str, 'probability': float}, ...] list per row,
+        sorted by descending probability
+    """
+    if not hasattr(model, 'predict_proba'):
+        return [[{'crop': str(pred), 'probability': 1.0}] for pred in model.predict(X)]
+
+    probs = np.asarray(model.predict_proba(X))
+    classes = np.asarray(model.classes_).astype(str)
+    k = max(1, min(int(top_k), probs.shape[1]))
+
+    idx = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(probs, idx, axis=1)
+    # order the k candidates by probability, ties by class order as before
+    order = np.lexsort((idx, -top), axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+
+    return [
+        [{'crop': c, 'probability': p} for c, p in zip(crops, row)]
+        for crops, row in zip(classes[idx].tolist(), top.tolist())
+    ]
+
+
+def predict_rows(model, X: np.ndarray, top_k: int = 5):
+    """
+    Score a feature matrix, isolating rows that cannot be scored
+
+    Rows with non-finite features are rejected up front. The remaining rows
+    are scored in one call; only if that call fails are they re-scored one
+    by one so the failing rows can be reported by index.
+
+    Returns:
+        Tuple of (predictions, errors) where predictions maps row index to
+        its top-k list and errors is a list of {'row_index', 'error'} dicts
+    """
+    errors = []
+    valid = np.isfinite(X).all(axis=1)
+    for i in np.flatnonzero(~valid).tolist():
+        errors.append({'row_index': i, 'error': 'Non-finite feature value'})
+
+    rows = np.flatnonzero(valid)
+    if len(rows) == 0:
+        return {}, errors
+
+    try:
+        preds = top_k_predictions(model, X[rows], top_k)
+        return dict(zip(rows.tolist(), preds)), errors
+    except Exception:
+        pass
+
+    predictions = {}
+    for i in rows.tolist():
+        try:
+            predictions[i] = top_k_predictions(model, X[i:i + 1], top_k)[0]
+        except Exception as e:
+            errors.append({'row_index': i, 'error': str(e)})
+    errors.sort(key=lambda e: e['row_index'])
+    return predictions, errors
+
+
+def prediction_key(model_token, x: np.ndarray, top_k: int):
+    """
+    Quantize a one-row feature matrix and build its prediction cache key
+
+    Returns:
+        Tuple of (key, x); key is None (and x unchanged) when the cache is
+        disabled or the model has no token
+    """
+    if model_token is None or not prediction_cache.enabled:
+        return None, x
+    # adding 0.0 folds -0.0 into 0.0 so both hash to the same key
+    x = np.round(x, settings.prediction_cache_decimals) + 0.0
+    return (model_token, tuple(x[0].tolist()), int(top_k)), x
+
+
+def predict_one(model, model_token, x: np.ndarray, top_k: int = 5):
+    """
+    Top-k predictions for a one-row feature matrix, served from the cache when possible
+
+    Returns:
+        Tuple of (predictions, cached) where cached is True if the model was not run
+    """
+    key, x = prediction_key(model_token, x, top_k)
+    if key is not None:
+        preds = prediction_cache.get(key)
+        if preds is not None:
+            return preds, True
+    preds = top_k_predictions(model, x, top_k)[0]
+    if key is not None:
+        prediction_cache.put(key, preds)
+    return preds, False
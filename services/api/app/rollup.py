@@ -0,0 +1,131 @@
+"""
+Time-bucketed readings from the continuous aggregates.
+
+``readings_1m``, ``readings_1h`` and ``readings_1d`` (created by
+app/migrations/0007_readings_rollups.sql) hold per farm/sensor buckets with
+the sum, count, min and max of every feature. ``get_rollup`` answers a time
+range with at most ``max_points`` buckets: it reads the coarsest view whose
+bucket still fits the budget and, when even that gives too many rows,
+re-buckets it to a multiple of its width. Averages are weighted by the
+number of readings (``sum(x_sum) / sum(x_count)``), so combining sensors or
+buckets gives the same result as averaging the raw rows.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.crud import READING_FEATURES
+
+# (view, bucket width), finest first
+ROLLUP_VIEWS = [
+    ('readings_1m', timedelta(minutes=1)),
+    ('readings_1h', timedelta(hours=1)),
+    ('readings_1d', timedelta(days=1)),
+]
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS = 10000
+DEFAULT_RANGE = timedelta(days=1)
+
+
+def _utc(ts: datetime):
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def choose_bucket(start: datetime, end: datetime, max_points: int):
+    """
+    Pick the view and bucket width for a time range and point budget
+
+    Returns:
+        Tuple of (view name, view bucket width, output bucket width); the
+        output width is a whole multiple of the view width and yields at
+        most max_points buckets over [start, end)
+    """
+    span = (end - start).total_seconds()
+    # one bucket of slack: the range need not start on a bucket boundary
+    needed = span / max(max_points - 1, 1)
+    view, width = ROLLUP_VIEWS[0]
+    for name, w in ROLLUP_VIEWS:
+        if w.total_seconds() <= needed:
+            view, width = name, w
+    multiple = max(1, math.ceil(needed / width.total_seconds()))
+    return view, width, width * multiple
+
+
+def rollup_sql(view: str, features, farm_id=None, sensor_id=None):
+    """SELECT combining the view's buckets into :bucket-wide points (weighted averages)"""
+    columns = ['time_bucket(:bucket, bucket) AS ts', 'sum(readings) AS readings']
+    for f in features:
+        columns += [
+            f'sum({f}_sum)::float8 / NULLIF(sum({f}_count), 0) AS {f}_avg',
+            f'min({f}_min) AS {f}_min',
+            f'max({f}_max) AS {f}_max',
+            f'sum({f}_count) AS {f}_count'
+        ]
+    # include the view bucket that contains start
+    where = ['bucket >= time_bucket(:view_bucket, CAST(:start AS timestamptz))', 'bucket < :end']
+    if farm_id is not None:
+        where.append('farm_id = :farm_id')
+    if sensor_id is not None:
+        where.append('sensor_id = :sensor_id')
+    return text(
+        f'SELECT {", ".join(columns)} FROM {view} WHERE {" AND ".join(where)} '
+        f'GROUP BY 1 ORDER BY 1'
+    )
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def get_rollup(db: Session, start: datetime = None, end: datetime = None, farm_id: int = None,
+               sensor_id: str = None, max_points: int = DEFAULT_MAX_POINTS, features=None):
+    """
+    Bucketed avg/min/max/count of readings over a time range
+
+    Args:
+        db: Database session
+        start: Range start (default: end - 1 day); naive datetimes are UTC
+        end: Range end, exclusive (default: now)
+        farm_id: Only this farm
+        sensor_id: Only this sensor
+        max_points: Upper bound on the number of returned buckets
+        features: Feature names to aggregate (default: all of READING_FEATURES)
+
+    Returns:
+        Dict with the view read, bucket width in seconds and the points
+
+    Raises:
+        ValueError: On an empty range or an unknown feature
+    """
+    end = _utc(end) if end else datetime.now(timezone.utc)
+    start = _utc(start) if start else end - DEFAULT_RANGE
+    if start >= end:
+        raise ValueError('start must be before end')
+    features = features or READING_FEATURES
+    unknown = [f for f in features if f not in READING_FEATURES]
+    if unknown:
+        raise ValueError(f'Unknown fields {unknown}, expected any of {READING_FEATURES}')
+
+    view, view_bucket, bucket = choose_bucket(start, end, max_points)
+    params = {'bucket': bucket, 'view_bucket': view_bucket, 'start': start, 'end': end,
+              'farm_id': farm_id, 'sensor_id': sensor_id}
+    rows = db.execute(rollup_sql(view, features, farm_id, sensor_id), params).mappings().all()
+
+    points = []
+    for row in rows:
+        point = {'ts': row['ts'].isoformat(), 'readings': int(row['readings'] or 0)}
+        for f in features:
+            point[f] = {
+                'avg': _number(row[f'{f}_avg']),
+                'min': _number(row[f'{f}_min']),
+                'max': _number(row[f'{f}_max']),
+                'count': int(row[f'{f}_count'] or 0)
+            }
+        points.append(point)
+    return {
+        'view': view,
+        'bucket_seconds': int(bucket.total_seconds()),
+        'start': start,
+        'end': end,
+        'points': points
+    }
@@ -13,6 +13,7 @@ class ReadingIn(BaseModel):
     n: Optional[int] = None
     p: Optional[int] = None
     k: Optional[int] = None
+    label: Optional[str] = None
 
 class PredictRequest(BaseModel):
     farm_id: Optional[int] = None
@@ -30,6 +31,10 @@ class ModelIn(BaseModel):
     metadata: Optional[dict] = None
     activate: Optional[bool] = False
 
+class ShadowConfigIn(BaseModel):
+    """Share of /predict traffic (0..1) a candidate model scores in shadow mode"""
+    fraction: float = Field(ge=0, le=1)
+
 class ModelOut(BaseModel):
     id: int
     name: str
@@ -38,6 +43,7 @@ class ModelOut(BaseModel):
     accuracy: Optional[float] = None
     metadata: Optional[dict] = None
     active: Optional[int] = 0
+    shadow_fraction: Optional[float] = None
     created_at: Optional[datetime] = None
 
 class Health(BaseModel):
@@ -64,6 +70,7 @@ class DataStatsResponse(BaseModel):
     date_range: dict
     temp_stats: dict
     humidity_stats: dict
+    field_stats: Optional[dict] = None
 
 class PredictBatchRequest(BaseModel):
     """Request schema for batch predictions"""
@@ -75,6 +82,7 @@ class PredictBatchResponse(BaseModel):
     predictions: List[dict]
     processed_rows: int
     failed_rows: int
+    errors: Optional[List[dict]] = None
     processing_time_ms: float
 
 class CropInfo(BaseModel):
@@ -96,4 +104,27 @@ class FilteredReadingsRequest(BaseModel):
     temp_min: Optional[float] = None
     temp_max: Optional[float] = None
     limit: Optional[int] = 100
+    cursor: Optional[str] = None
+
+class FilteredReadingsResponse(BaseModel):
+    """One keyset page of filtered readings"""
+    readings: List[dict]
+    next_cursor: Optional[str] = None
+
+class RollupResponse(BaseModel):
+    """Bucketed readings from the continuous aggregates"""
+    view: str
+    bucket_seconds: int
+    start: datetime
+    end: datetime
+    points: List[dict]
 
+class SeriesResponse(BaseModel):
+    """Downsampled time series of one reading field"""
+    field: str
+    method: str
+    source: str
+    bucket_seconds: Optional[int] = None
+    input_points: int
+    ts: List[str]
+    values: List[float]
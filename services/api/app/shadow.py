@@ -0,0 +1,216 @@
+"""
+Shadow evaluation of candidate models on live prediction traffic.
+
+Inactive registry records with ``shadow_fraction > 0`` are candidates. After
+/predict or /predict/batch has computed its response, the same feature
+matrix is handed to a bounded background pool; each candidate scores it with
+probability ``shadow_fraction``. The worker compares the candidate's top crop
+with the served one and records agreement and latency per model. Requests
+never wait on a candidate: when ``SHADOW_MAX_PENDING`` jobs are queued, new
+samples are dropped and counted.
+
+The candidate list is re-read from the database every
+``MODEL_CACHE_CHECK_SECONDS`` by a background job, not on the request path.
+"""
+import random
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app import crud, predictor
+from app.config import settings
+from app.database import SessionLocal
+from app.model_cache import model_cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 1000
+LOG_EVERY = 100
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+class ShadowModelStats:
+    """Agreement and latency counters for one candidate model"""
+
+    def __init__(self, record_id: int, name: str):
+        self.record_id = record_id
+        self.name = name
+        self.evaluations = 0
+        self.rows = 0
+        self.agreements = 0
+        self.errors = 0
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.primary_latencies_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        shadow = list(self.latencies_ms)
+        primary = list(self.primary_latencies_ms)
+        return {
+            'model_id': self.record_id,
+            'name': self.name,
+            'evaluations': self.evaluations,
+            'rows': self.rows,
+            'agreement_rate': self.agreements / self.rows if self.rows else None,
+            'errors': self.errors,
+            'latency_ms_p50': _percentile(shadow, 50),
+            'latency_ms_p95': _percentile(shadow, 95),
+            'primary_latency_ms_p50': _percentile(primary, 50),
+            'primary_latency_ms_p95': _percentile(primary, 95)
+        }
+
+
+class ShadowEvaluator:
+    """Scores sampled requests with candidate models off the request path"""
+
+    def __init__(self, workers: int = 2, max_pending: int = 100, check_interval: float = 5.0):
+        self.max_pending = max_pending
+        self.check_interval = check_interval
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='shadow')
+        self._lock = threading.Lock()
+        self._candidates = []
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._pending = 0
+        self._stats = {}
+        self.sampled = 0
+        self.dropped = 0
+
+    def _submit(self, fn, *args):
+        """Queue a job unless max_pending jobs are already waiting"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+        try:
+            self._executor.submit(self._run, fn, *args)
+        except RuntimeError:
+            # executor shut down
+            with self._lock:
+                self._pending -= 1
+            return False
+        return True
+
+    def _run(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.warning(f'Shadow job failed: {e}')
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _refresh_candidates(self):
+        db = SessionLocal()
+        try:
+            records = crud.get_shadow_models(db)
+            candidates = [(r, float(r.shadow_fraction)) for r in records]
+        finally:
+            db.close()
+            with self._lock:
+                self._refreshing = False
+        model_cache.retain_records([r.id for r, _ in candidates])
+        with self._lock:
+            self._candidates = candidates
+            self._checked_at = time.monotonic()
+
+    def observe(self, x: np.ndarray, served, primary_latency_ms: float = None):
+        """
+        Offer a scored request to the shadow candidates (never blocks)
+
+        Args:
+            x: Feature matrix the served model scored
+            served: Served top-k lists, one per row of x
+            primary_latency_ms: Time the served model took for x (None if it was
+                served from the prediction cache; no latency sample is kept)
+        """
+        with self._lock:
+            refresh = not self._refreshing and time.monotonic() - self._checked_at >= self.check_interval
+            if refresh:
+                self._refreshing = True
+            candidates = self._candidates
+        if refresh and not self._submit(self._refresh_candidates):
+            with self._lock:
+                self._refreshing = False
+
+        if not candidates or len(x) == 0:
+            return
+        served_top = [preds[0]['crop'] if preds else None for preds in served]
+        for record, fraction in candidates:
+            if random.random() < fraction:
+                with self._lock:
+                    self.sampled += 1
+                self._submit(self._evaluate, record, x, served_top, primary_latency_ms)
+
+    def _evaluate(self, record, x, served_top, primary_latency_ms):
+        with self._lock:
+            stats = self._stats.get(record.id)
+            if stats is None:
+                stats = self._stats[record.id] = ShadowModelStats(record.id, record.name)
+        model = model_cache.get_record_model(record)
+        if model is None:
+            with self._lock:
+                stats.errors += 1
+            return
+        start = time.perf_counter()
+        try:
+            preds = predictor.top_k_predictions(model, x, 1)
+        except Exception as e:
+            with self._lock:
+                stats.errors += 1
+            logger.warning(f'Shadow model {record.id} ({record.name}) failed: {e}')
+            return
+        latency_ms = (time.perf_counter() - start) * 1000
+        agreements = sum(1 for p, top in zip(preds, served_top) if p and p[0]['crop'] == top)
+
+        with self._lock:
+            stats.evaluations += 1
+            stats.rows += len(served_top)
+            stats.agreements += agreements
+            stats.latencies_ms.append(latency_ms)
+            if primary_latency_ms is not None:
+                stats.primary_latencies_ms.append(primary_latency_ms)
+            snapshot = stats.snapshot() if stats.evaluations % LOG_EVERY == 0 else None
+        if snapshot:
+            logger.info(
+                f"Shadow model {record.id} ({record.name}): agreement {snapshot['agreement_rate']:.3f} over {snapshot['rows']} rows, "
+                f"p50 {snapshot['latency_ms_p50']:.2f}ms vs served p50 {snapshot['primary_latency_ms_p50'] or 0:.2f}ms"
+            )
+
+    def stats(self):
+        with self._lock:
+            return {
+                'candidates': [{'model_id': r.id, 'name': r.name, 'fraction': f} for r, f in self._candidates],
+                'sampled': self.sampled,
+                'dropped': self.dropped,
+                'pending': self._pending,
+                'models': [s.snapshot() for s in self._stats.values()]
+            }
+
+    def reload(self):
+        """Re-read the candidate list on the next request"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def reset(self):
+        """Clear the per-model counters and re-read the candidates on the next request"""
+        with self._lock:
+            self._stats = {}
+            self.sampled = 0
+            self.dropped = 0
+            self._checked_at = 0.0
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+shadow_evaluator = ShadowEvaluator(
+    workers=settings.shadow_workers,
+    max_pending=settings.shadow_max_pending,
+    check_interval=settings.model_cache_check_seconds
+)
@@ -0,0 +1,206 @@
+"""
+Chunking, compression and retention of the readings hypertable.
+
+The policies are configured through settings and applied by
+``python -m app.migrate`` after the migrations, so changing them is a
+redeploy rather than a new migration:
+
+    READINGS_CHUNK_INTERVAL   chunk width for new chunks (default 7 days)
+    READINGS_COMPRESS_AFTER   compress chunks older than this (default 7 days,
+                              empty disables the policy)
+    READINGS_RETENTION        drop raw chunks older than this (default empty:
+                              keep raw readings forever)
+
+The readings_1m/1h/1d continuous aggregates have no retention policy, so
+rollups are kept after the raw rows are dropped. A retention window that is
+not longer than their refresh windows is refused, because refreshing a range
+whose raw chunks are gone would empty those buckets.
+
+``storage_report`` lists compressed vs. uncompressed size per chunk (GET
+/admin/storage).
+"""
+import logging
+from sqlalchemy import text
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+HYPERTABLE = 'readings'
+
+
+def _job(conn, proc_name: str, hypertable: str = HYPERTABLE):
+    return conn.execute(text(
+        'SELECT job_id, config FROM timescaledb_information.jobs '
+        'WHERE proc_name = :proc AND hypertable_name = :hypertable'
+    ), {'proc': proc_name, 'hypertable': hypertable}).first()
+
+
+def _same_interval(conn, a, b) -> bool:
+    return bool(conn.execute(text('SELECT CAST(:a AS interval) = CAST(:b AS interval)'), {'a': a, 'b': b}).scalar())
+
+
+def _apply_policy(conn, proc_name: str, config_key: str, value: str, add_sql: str, remove_sql: str):
+    """Add, replace or remove one policy job so it matches value; returns what changed"""
+    job = _job(conn, proc_name)
+    if not value:
+        if job is None:
+            return 'disabled'
+        conn.execute(text(remove_sql), {'hypertable': HYPERTABLE})
+        return 'removed'
+    if job is not None and _same_interval(conn, job.config.get(config_key), value):
+        return 'unchanged'
+    if job is not None:
+        conn.execute(text(remove_sql), {'hypertable': HYPERTABLE})
+    conn.execute(text(add_sql), {'hypertable': HYPERTABLE, 'value': value})
+    return 'replaced' if job is not None else 'added'
+
+
+def _check_retention(conn, retention: str):
+    """Refuse a retention window that the continuous aggregate refreshes reach into"""
+    longest = conn.execute(text(
+        "SELECT max((config->>'start_offset')::interval) FROM timescaledb_information.jobs "
+        "WHERE proc_name = 'policy_refresh_continuous_aggregate'"
+    )).scalar()
+    if longest is not None and conn.execute(
+        text('SELECT CAST(:retention AS interval) <= :longest'), {'retention': retention, 'longest': longest}
+    ).scalar():
+        raise ValueError(f'READINGS_RETENTION={retention} must be longer than the rollup refresh window ({longest})')
+
+
+def apply_policies(conn):
+    """
+    Bring chunk interval, compression and retention of readings in line with settings
+
+    Args:
+        conn: SQLAlchemy connection (the caller commits)
+
+    Returns:
+        Dict of setting -> what was done
+
+    Raises:
+        ValueError: If the retention window is not longer than the rollup refresh window
+    """
+    changes = {}
+    current = conn.execute(text(
+        'SELECT time_interval FROM timescaledb_information.dimensions WHERE hypertable_name = :hypertable'
+    ), {'hypertable': HYPERTABLE}).scalar()
+    if settings.readings_chunk_interval and not _same_interval(conn, current, settings.readings_chunk_interval):
+        # only affects chunks created from now on
+        conn.execute(text('SELECT set_chunk_time_interval(:hypertable, CAST(:value AS interval))'),
+                     {'hypertable': HYPERTABLE, 'value': settings.readings_chunk_interval})
+        changes['chunk_interval'] = 'changed'
+    else:
+        changes['chunk_interval'] = 'unchanged'
+
+    changes['compression'] = _apply_policy(
+        conn, 'policy_compression', 'compress_after', settings.readings_compress_after,
+        'SELECT add_compression_policy(:hypertable, CAST(:value AS interval))',
+        'SELECT remove_compression_policy(:hypertable, if_exists => TRUE)'
+    )
+
+    if settings.readings_retention:
+        _check_retention(conn, settings.readings_retention)
+    changes['retention'] = _apply_policy(
+        conn, 'policy_retention', 'drop_after', settings.readings_retention,
+        'SELECT add_retention_policy(:hypertable, CAST(:value AS interval))',
+        'SELECT remove_retention_policy(:hypertable, if_exists => TRUE)'
+    )
+    logger.info(f'Storage policies for {HYPERTABLE}: ' + ', '.join(f'{k} {v}' for k, v in changes.items()))
+    return changes
+
+
+CHUNKS_SQL = '''
+SELECT c.chunk_schema, c.chunk_name, c.range_start, c.range_end, c.is_compressed,
+       s.total_bytes, cs.before_compression_total_bytes, cs.after_compression_total_bytes
+FROM timescaledb_information.chunks c
+LEFT JOIN chunks_detailed_size(:hypertable) s
+    ON s.chunk_schema = c.chunk_schema AND s.chunk_name = c.chunk_name
+LEFT JOIN chunk_compression_stats(:hypertable) cs
+    ON cs.chunk_schema = c.chunk_schema AND cs.chunk_name = c.chunk_name
+WHERE c.hypertable_schema = 'public' AND c.hypertable_name = :hypertable
+ORDER BY c.range_start
+'''
+
+ROLLUPS_SQL = '''
+SELECT view_name,
+       hypertable_size(format('%I.%I', materialization_hypertable_schema, materialization_hypertable_name)::regclass) AS total_bytes
+FROM timescaledb_information.continuous_aggregates
+WHERE hypertable_name = :hypertable
+ORDER BY view_name
+'''
+
+JOBS_SQL = '''
+SELECT job_id, proc_name, hypertable_name, schedule_interval, config
+FROM timescaledb_information.jobs
+WHERE hypertable_name = :hypertable
+   OR hypertable_name IN (
+       SELECT materialization_hypertable_name FROM timescaledb_information.continuous_aggregates
+       WHERE hypertable_name = :hypertable
+   )
+ORDER BY job_id
+'''
+
+
+def _ratio(before, after):
+    return round(before / after, 2) if before and after else None
+
+
+def storage_report(db):
+    """
+    Per-chunk and total size of readings before and after compression
+
+    Args:
+        db: Database session
+
+    Returns:
+        Dict with chunks, totals, rollup view sizes and the policy jobs
+    """
+    params = {'hypertable': HYPERTABLE}
+    chunks = []
+    total_before = total_after = 0
+    for row in db.execute(text(CHUNKS_SQL), params).mappings():
+        if row['is_compressed']:
+            before = int(row['before_compression_total_bytes'] or 0)
+            after = int(row['after_compression_total_bytes'] or 0)
+        else:
+            before = after = int(row['total_bytes'] or 0)
+        total_before += before
+        total_after += after
+        chunks.append({
+            'chunk': f"{row['chunk_schema']}.{row['chunk_name']}",
+            'range_start': row['range_start'].isoformat() if row['range_start'] else None,
+            'range_end': row['range_end'].isoformat() if row['range_end'] else None,
+            'compressed': bool(row['is_compressed']),
+            'uncompressed_bytes': before,
+            'stored_bytes': after,
+            'compression_ratio': _ratio(before, after) if row['is_compressed'] else None
+        })
+    rollups = {row.view_name: int(row.total_bytes or 0) for row in db.execute(text(ROLLUPS_SQL), params)}
+    jobs = [
+        {
+            'job_id': row.job_id,
+            'proc_name': row.proc_name,
+            'hypertable': row.hypertable_name,
+            'schedule_interval': str(row.schedule_interval),
+            'config': row.config
+        }
+        for row in db.execute(text(JOBS_SQL), params)
+    ]
+    return {
+        'hypertable': HYPERTABLE,
+        'chunks': chunks,
+        'totals': {
+            'chunks': len(chunks),
+            'compressed_chunks': sum(1 for c in chunks if c['compressed']),
+            'uncompressed_bytes': total_before,
+            'stored_bytes': total_after,
+            'compression_ratio': _ratio(total_before, total_after)
+        },
+        'rollups_bytes': rollups,
+        'jobs': jobs,
+        'settings': {
+            'chunk_interval': settings.readings_chunk_interval,
+            'compress_after': settings.readings_compress_after or None,
+            'retention': settings.readings_retention or None
+        }
+    }
@@ -0,0 +1,89 @@
+"""
+Compare the sync and async API modes under concurrent load.
+
+Start two API instances against the same database, one with the default sync
+handlers and one with API_ASYNC_MODE=true, e.g.
+
+    uvicorn app.main:app --port 8000
+    API_ASYNC_MODE=true uvicorn app.main:app --port 8001
+
+then run
+
+    python benchmarks/api_modes.py --sync-url http://localhost:8000 --async-url http://localhost:8001
+
+For each mode and endpoint the script fires --requests requests with
+--concurrency in flight and reports throughput and latency percentiles.
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+ENDPOINTS = {
+    'ingest': lambda: ('/ingest', {
+        'sensor_id': f'bench_{random.randint(1, 50)}',
+        'farm_id': random.randint(1, 5),
+        'temperature': round(random.uniform(10, 35), 2),
+        'humidity': round(random.uniform(20, 90), 2),
+        'ph': round(random.uniform(4.5, 8.5), 2),
+        'rainfall': round(random.uniform(0, 200), 2),
+        'n': random.randint(0, 140),
+        'p': random.randint(0, 140),
+        'k': random.randint(0, 140)
+    }),
+    'predict': lambda: ('/predict', {'farm_id': random.randint(1, 5)}),
+    'filtered': lambda: ('/data/filtered', {'farm_id': random.randint(1, 5), 'limit': 100})
+}
+
+
+def run(base_url: str, endpoint: str, total: int, concurrency: int):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def one(_):
+        path, payload = ENDPOINTS[endpoint]()
+        start = time.perf_counter()
+        try:
+            ok = session.post(f'{base_url}{path}', json=payload, timeout=30).status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    return {
+        'rps': total / elapsed,
+        'errors': sum(1 for r in results if not r[1]),
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync-url', default='http://localhost:8000')
+    parser.add_argument('--async-url', default='http://localhost:8001')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<10} {'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint in args.endpoints.split(','):
+        for mode, url in (('sync', args.sync_url), ('async', args.async_url)):
+            r = run(url, endpoint, args.requests, args.concurrency)
+            print(f"{endpoint:<10} {mode:<6} {r['rps']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare model start-up time and memory across API worker processes.
+
+Each mode starts --workers processes that load the model the way an API
+worker would, score one row and then stay alive while their memory is read
+from /proc/<pid>/smaps_rollup (Linux only):
+
+    joblib           joblib.load(path), private copy per worker
+    joblib-mmap      joblib.load(path, mmap_mode='r')
+    compiled         CompiledForest from <stem>.forest/, arrays copied
+    compiled-mmap    CompiledForest with np.load(mmap_mode='r')
+
+RSS counts shared page-cache pages in every worker; PSS divides them among
+the workers sharing them, so the PSS total is the real footprint.
+
+    python benchmarks/model_loading.py --model ../../ml/models/crop_rf.joblib --workers 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+MODES = ['joblib', 'joblib-mmap', 'compiled', 'compiled-mmap']
+
+
+def _load(mode, path):
+    import numpy as np
+    if mode.startswith('joblib'):
+        import joblib
+        model = joblib.load(path, mmap_mode='r' if mode == 'joblib-mmap' else None)
+    else:
+        from app import forest
+        model = forest.CompiledForest.load(forest.forest_dir(path), mmap=mode == 'compiled-mmap')
+    model.predict_proba(np.zeros((1, 7)))
+    return model
+
+
+def _worker(mode, path, ready, done):
+    start = time.perf_counter()
+    model = _load(mode, path)
+    ready.put(time.perf_counter() - start)
+    done.wait()
+    del model
+
+
+def _memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def run(mode, path, workers):
+    ctx = mp.get_context('spawn')
+    ready, done = ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(mode, path, ready, done)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    load_times = [ready.get(timeout=300) for _ in procs]
+    memory = [_memory_kb(p.pid) for p in procs]
+    done.set()
+    for p in procs:
+        p.join()
+    return {
+        'load_ms': statistics.median(load_times) * 1000,
+        'rss_mb': sum(m['Rss'] for m in memory) / 1024,
+        'pss_mb': sum(m['Pss'] for m in memory) / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', '../../ml/models/crop_rf.joblib'))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    from app import forest
+    print(f"{'mode':<15} {'load ms (median)':>17} {'RSS total MB':>13} {'PSS total MB':>13}")
+    for mode in args.modes.split(','):
+        if mode.startswith('compiled') and not os.path.isdir(forest.forest_dir(args.model)):
+            print(f'{mode:<15} skipped: no compiled export next to {args.model} (run ml/train.py)')
+            continue
+        r = run(mode, args.model, args.workers)
+        print(f"{mode:<15} {r['load_ms']:>17.1f} {r['rss_mb']:>13.1f} {r['pss_mb']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@ import streamlit as st
 import pandas as pd
 import requests
 from sqlalchemy import create_engine, text
-from datetime import datetime
+from datetime import datetime, timedelta
 
 DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql+psycopg2://postgres:postgres@db:5432/smart_agri')
 API_URL = os.getenv('API_URL', 'http://api:8000')
@@ -50,6 +50,60 @@ def get_active_model():
         st.warning(f'Failed to fetch active model: {e}')
         return None
 
+ROLLUP_RANGES = {'24 hours': 1, '7 days': 7, '30 days': 30, '1 year': 365}
+
+@st.cache_data(ttl=60)
+def get_rollup(days, field):
+    """Fetch bucketed avg/min/max of one field over the last days from API"""
+    try:
+        end = datetime.utcnow()
+        params = {
+            'start': (end - timedelta(days=days)).isoformat(),
+            'end': end.isoformat(),
+            'fields': field,
+            'max_points': 500
+        }
+        resp = requests.get(f'{API_URL}/data/rollup', params=params, timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+    except Exception as e:
+        st.warning(f'Failed to fetch rollup: {e}')
+        return None
+
+@st.cache_data(ttl=10)
+def get_anomalies(field=None, min_zscore=None, limit=200):
+    """Fetch the most recent anomalies detected by the API"""
+    try:
+        params = {'limit': limit}
+        if field:
+            params['field'] = field
+        if min_zscore:
+            params['min_zscore'] = min_zscore
+        resp = requests.get(f'{API_URL}/anomalies', params=params, timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+    except Exception as e:
+        st.warning(f'Failed to fetch anomalies: {e}')
+        return None
+
+ANALYTICS_RANGES = {'24 hours': 1, '7 days': 7, '30 days': 30, 'All time': None}
+
+@st.cache_data(ttl=60)
+def get_analytics(endpoint, days):
+    """Fetch /analytics/{endpoint} over the last days (None for all readings) from API"""
+    try:
+        params = {}
+        if days:
+            # whole hours keep the window, and so the API's cache key, stable between renders
+            start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(days=days)
+            params['start'] = start.isoformat()
+        resp = requests.get(f'{API_URL}/analytics/{endpoint}', params=params, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+    except Exception as e:
+        st.warning(f'Failed to fetch {endpoint} analytics: {e}')
+        return None
+
 df = get_recent(num)
 
 # ============ TAB 1: READINGS ============
@@ -552,6 +606,25 @@ with tab4:
                 st.bar_chart(df_chart.set_index('ts')[['rainfall']])
         else:
             st.info('No data available')
+        
+        # long ranges come pre-aggregated from the continuous aggregates via /data/rollup
+        st.subheader('📅 Long-Range Trends')
+        col_range, col_field = st.columns(2)
+        with col_range:
+            range_label = st.selectbox('Range', list(ROLLUP_RANGES), index=1, key='rollup_range')
+        with col_field:
+            rollup_field = st.selectbox('Field', ['temperature', 'humidity', 'ph', 'rainfall', 'n', 'p', 'k'], key='rollup_field')
+        rollup = get_rollup(ROLLUP_RANGES[range_label], rollup_field)
+        if rollup and rollup['points']:
+            df_rollup = pd.DataFrame([
+                {'ts': p['ts'], 'avg': p[rollup_field]['avg'], 'min': p[rollup_field]['min'], 'max': p[rollup_field]['max']}
+                for p in rollup['points']
+            ])
+            df_rollup['ts'] = pd.to_datetime(df_rollup['ts'])
+            st.line_chart(df_rollup.set_index('ts')[['min', 'avg', 'max']])
+            st.caption(f"{len(df_rollup)} buckets of {rollup['bucket_seconds'] // 60} min from {rollup['view']}")
+        else:
+            st.info('No aggregated data for this range')
     
     with analytics_tabs[1]:
         st.subheader('🌾 Crop-Specific Analytics')
@@ -583,60 +656,55 @@ with tab4:
     
     with analytics_tabs[2]:
         st.subheader('📈 Feature Correlation Analysis')
-        if len(df) > 2:
-            numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-            numeric_cols = [c for c in numeric_cols if c not in ['id', 'farm_id', 'sensor_id']]
-            
-            if len(numeric_cols) > 1:
-                corr_matrix = df[numeric_cols].corr()
-                st.write('Correlation matrix between environmental factors:')
-                st.dataframe(corr_matrix, use_container_width=True)
-                st.info('Higher values (close to 1) indicate strong positive correlation')
+        corr_range = st.selectbox('Range', list(ANALYTICS_RANGES), index=1, key='corr_range')
+        correlation = get_analytics('correlation', ANALYTICS_RANGES[corr_range])
+        if correlation and correlation['readings'] > 2:
+            corr_matrix = pd.DataFrame(correlation['matrix'], index=correlation['fields'], columns=correlation['fields'])
+            st.write('Correlation matrix between environmental factors:')
+            st.dataframe(corr_matrix, use_container_width=True)
+            st.caption(f"Computed over {correlation['readings']} readings")
+            st.info('Higher values (close to 1) indicate strong positive correlation')
         else:
             st.info('Insufficient data for correlation analysis')
     
     with analytics_tabs[3]:
         st.subheader('⚠️ Anomaly Detection')
-        if len(df) > 0 and 'temperature' in df.columns:
-            temp_mean = df['temperature'].mean()
-            temp_std = df['temperature'].std()
-            temp_thresh = 2 * temp_std
-            
-            anomalies = df[abs(df['temperature'] - temp_mean) > temp_thresh]
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric('⚠️ Anomalies', len(anomalies))
-            with col2:
-                st.metric('Normal Range', f'{temp_mean - temp_thresh:.1f}°C - {temp_mean + temp_thresh:.1f}°C')
-            
-            if len(anomalies) > 0:
-                st.write('Detected anomalies:')
-                st.dataframe(anomalies[['ts', 'temperature', 'farm_id']], use_container_width=True)
+        st.caption('Flagged on ingest against each sensor\'s rolling (EWMA) mean and variance, for all seven fields')
+        col_field, col_z = st.columns(2)
+        with col_field:
+            anomaly_field = st.selectbox('Field', ['all', 'temperature', 'humidity', 'ph', 'rainfall', 'n', 'p', 'k'], key='anomaly_field')
+        with col_z:
+            anomaly_min_z = st.number_input('Minimum |z-score|', min_value=0.0, value=0.0, step=0.5, key='anomaly_min_z')
+        anomalies = get_anomalies(None if anomaly_field == 'all' else anomaly_field, anomaly_min_z or None)
+        if anomalies is not None:
+            st.metric('⚠️ Anomalies', anomalies['count'])
+            if anomalies['anomalies']:
+                df_anomalies = pd.DataFrame(anomalies['anomalies'])
+                st.dataframe(df_anomalies[['ts', 'sensor_id', 'farm_id', 'field', 'value', 'mean', 'std', 'zscore']], use_container_width=True)
             else:
                 st.success('✅ No anomalies detected')
-        else:
-            st.info('Cannot detect anomalies - insufficient data')
     
     with analytics_tabs[4]:
         st.subheader('🏢 Multi-Farm Comparison')
-        if 'farm_id' in df.columns and len(df) > 0:
-            farms = sorted(df['farm_id'].unique())
+        farm_range = st.selectbox('Range', list(ANALYTICS_RANGES), index=1, key='farm_range')
+        summary = get_analytics('farms', ANALYTICS_RANGES[farm_range])
+        if summary and summary['farms']:
             farm_data = []
-            
-            for farm in farms:
-                farm_df = df[df['farm_id'] == farm]
+            for farm in summary['farms']:
+                temperature = farm['fields']['temperature']['avg']
+                humidity = farm['fields']['humidity']['avg']
                 farm_data.append({
-                    'Farm ID': farm,
-                    'Readings': len(farm_df),
-                    'Avg Temp': f"{farm_df['temperature'].mean():.1f}°C" if 'temperature' in farm_df.columns else 'N/A',
-                    'Avg Humidity': f"{farm_df['humidity'].mean():.1f}%" if 'humidity' in farm_df.columns else 'N/A',
-                    'Sensors': farm_df['sensor_id'].nunique() if 'sensor_id' in farm_df.columns else 0
+                    'Farm ID': farm['farm_id'],
+                    'Name': farm['name'] or '',
+                    'Readings': farm['readings'],
+                    'Avg Temp': f"{temperature:.1f}°C" if temperature is not None else 'N/A',
+                    'Avg Humidity': f"{humidity:.1f}%" if humidity is not None else 'N/A',
+                    'Sensors': farm['sensors']
                 })
             
             st.dataframe(pd.DataFrame(farm_data), use_container_width=True)
         else:
-            st.info('Single farm deployment')
+            st.info('No farm data for this range')
 
     # ============ TAB 5: DATA UPLOAD ============
     with tab5:
@@ -829,55 +897,13 @@ with tab4:
                         if st.button('🚀 Upload to Database', key='upload_csv_btn', use_container_width=True):
                             with st.spinner('📤 Processing and uploading...'):
                                 try:
-                                    # Read full CSV
+                                    # Stream the raw file to the API; it parses the CSV
+                                    # incrementally and applies the same column aliases
                                     uploaded_file.seek(0)
-                                    df_full = pd.read_csv(uploaded_file)
-                                
-                                    # Rename columns
-                                    df_full = df_full.rename(columns=rename_dict)
-                                
-                                    # Add auto-generated IDs
-                                    if 'sensor_id' not in df_full.columns:
-                                        df_full['sensor_id'] = range(1, len(df_full) + 1)
-                                
-                                    if 'farm_id' not in df_full.columns:
-                                        df_full['farm_id'] = 1
-                                
-                                    # Convert to list of dicts for API
-                                    readings_list = []
-                                    for _, row in df_full.iterrows():
-                                        reading = {
-                                            'sensor_id': str(row.get('sensor_id', '')) if row.get('sensor_id') else None,
-                                            'farm_id': int(row.get('farm_id', 1)) if row.get('farm_id') else None,
-                                            'temperature': float(row.get('temperature', 0.0)) if row.get('temperature') else None,
-                                            'humidity': float(row.get('humidity', 0.0)) if row.get('humidity') else None,
-                                            'ph': float(row.get('ph', 0.0)) if row.get('ph') else None,
-                                            'rainfall': float(row.get('rainfall', 0.0)) if row.get('rainfall') else None,
-                                            'n': int(row.get('n', 0)) if row.get('n') else None,
-                                            'p': int(row.get('p', 0)) if row.get('p') else None,
-                                            'k': int(row.get('k', 0)) if row.get('k') else None,
-                                        }
-                                        readings_list.append(reading)
-                                    
-                                    # Show upload statistics
-                                    st.subheader('📊 Upload Statistics')
-                                    col1, col2, col3 = st.columns(3)
-                                    with col1:
-                                        st.metric('Total Rows', f"{len(df_full):,}")
-                                    with col2:
-                                        st.metric('Unique Farms', df_full['farm_id'].nunique())
-                                    with col3:
-                                        st.metric('Unique Sensors', df_full['sensor_id'].nunique())
-                                
-                                    # Call API endpoint
-                                    payload = {
-                                        'readings': readings_list,
-                                        'batch_size': 500
-                                    }
-                                    
                                     response = requests.post(
-                                        f'{API_URL}/ingest/bulk',
-                                        json=payload,
+                                        f'{API_URL}/ingest/csv',
+                                        files={'file': (uploaded_file.name, uploaded_file, 'text/csv')},
+                                        params={'batch_size': 5000},
                                         timeout=300  # 5 min timeout for large files
                                     )
                                     response.raise_for_status()